@@ -1,16 +1,269 @@
+import base64
+import re
 from datetime import datetime, timedelta
 
+import orjson
+from bson import ObjectId, json_util
+from bson.errors import BSONError, InvalidId
 from fastapi import APIRouter, Query, HTTPException, Depends
+from fastapi.responses import Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING
+from core.cache import cache_key, current_generation, response_cache
 from core.database import get_database
+from core.derived import tokenize_os
+from core.export import CSV_FIELDS, export_chunks
+from core.host_details import version_key
+from core.rollups import STALE_AFTER_DAYS, get_fleet_stats
 from core.tasks import fetch_and_process_hosts_data
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 instances_router = APIRouter(
     prefix="/hosts",
     tags=["Hosts"],
 )
 
+# Hosts read from Mongo per round trip while exporting
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Fields the dashboard table needs, returned by view=summary
+SUMMARY_FIELDS = (
+    "id",
+    "device_id",
+    "host_id",
+    "name",
+    "fqdn",
+    "dns_host_name",
+    "address",
+    "network_interface.list.host_asset_interface.address",
+    "os",
+    "last_seen",
+    "modified",
+    "agent_info.last_checked_in",
+    "vuln_count",
+)
+
+
+def os_filter(operating_system: str) -> Dict[str, Any]:
+    """
+    Match hosts whose OS name has a token starting with each token of the input.
+
+    Tokens are matched with anchored, escaped prefix regexes on os_tokens, which
+    the os_tokens_id index serves as range scans, bounded by the cursor _id.
+    """
+    tokens = tokenize_os(operating_system)
+    if not tokens:
+        return {"os": {"$regex": re.escape(operating_system), "$options": "i"}}
+    patterns = [re.compile(f"^{re.escape(token)}") for token in tokens]
+    if len(patterns) == 1:
+        return {"os_tokens": patterns[0]}
+    return {"os_tokens": {"$all": patterns}}
+
+
+def build_host_query(
+    operating_system: Optional[str], is_old: Optional[bool]
+) -> Dict[str, Any]:
+    """Mongo filter for the host filters shared by the listing and the export"""
+    query = {}
+
+    if operating_system:
+        query.update(os_filter(operating_system))
+
+    if is_old is not None:
+        thirty_days_ago = datetime.utcnow() - timedelta(days=STALE_AFTER_DAYS)
+
+        if is_old:
+            query["last_seen"] = {"$lt": thirty_days_ago}
+        else:
+            query["last_seen"] = {"$gte": thirty_days_ago}
+
+    return query
+
+
+# Types a cursor may hold per sort field; anything else, such as a query
+# operator document, is rejected rather than passed into the filter
+CURSOR_FIELD_TYPES = {
+    "_id": (ObjectId, str),
+    "last_seen": (datetime, type(None)),
+}
+
+
+def host_sort_fields(
+    operating_system: Optional[str], is_old: Optional[bool]
+) -> List[str]:
+    """
+    Fields hosts are listed in for the given filters.
+
+    A last_seen range alone cannot be walked in _id order, so is_old on its
+    own lists hosts in (last_seen, _id) order straight off the last_seen_id
+    index. Everything else lists in _id order, which os_tokens_id and the _id
+    index provide.
+    """
+    if is_old is not None and not operating_system:
+        return ["last_seen", "_id"]
+    return ["_id"]
+
+
+def encode_cursor(last: Dict[str, Any], sort_fields: List[str]) -> str:
+    """Opaque token pointing past the given document in sort_fields order"""
+    payload = json_util.dumps({name: last[name] for name in sort_fields}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort_fields: List[str]) -> Dict[str, Any]:
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        after = json_util.loads(payload)
+        # A cursor of a listing with other filters has other sort fields
+        if not isinstance(after, dict) or sorted(after) != sorted(sort_fields):
+            raise ValueError
+        for name, value in after.items():
+            if not isinstance(value, CURSOR_FIELD_TYPES[name]):
+                raise ValueError
+        return after
+    except (ValueError, KeyError, TypeError, BSONError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(
+    query: Dict[str, Any], after: Optional[Dict[str, Any]], sort_fields: List[str]
+) -> Dict[str, Any]:
+    """query restricted to the documents sorting after the cursor position"""
+    if after is None:
+        return query
+    if sort_fields == ["_id"]:
+        return {**query, "_id": {"$gt": after["_id"]}}
+    # (a, b) > (x, y) is a > x, or a = x and b > y
+    branches = [
+        {
+            **{name: after[name] for name in sort_fields[:i]},
+            sort_fields[i]: {"$gt": after[sort_fields[i]]},
+        }
+        for i in range(len(sort_fields))
+    ]
+    return {"$and": [query, {"$or": branches}]} if query else {"$or": branches}
+
+
+def build_projection(view: str, fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Mongo projection for a listing, or None to return whole documents"""
+    names: List[str] = []
+    if view == "summary":
+        names.extend(SUMMARY_FIELDS)
+    if fields:
+        for name in fields.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if name.startswith("$") or ".$" in name:
+                raise HTTPException(status_code=400, detail=f"Invalid field: {name}")
+            names.append(name)
+    if not names:
+        return None
+    # Mongo rejects a projection holding both a field and one of its subfields
+    return {
+        name: 1
+        for name in names
+        if not any(name.startswith(f"{other}.") for other in names)
+    }
+
+
+def software_query(
+    name: str, version_lt: Optional[str], version_gte: Optional[str]
+) -> Dict[str, Any]:
+    """host_software filter on the name and a version range, by version_key"""
+    query: Dict[str, Any] = {"name_lower": name.strip().lower()}
+    bounds = {}
+    for operator, version in (("$lt", version_lt), ("$gte", version_gte)):
+        if version is None:
+            continue
+        key = version_key(version)
+        if key is None:
+            raise HTTPException(status_code=400, detail=f"Invalid version: {version}")
+        bounds[operator] = key
+    if bounds:
+        query["version_key"] = bounds
+    return query
+
+
+async def lookup_page(
+    db: AsyncIOMotorDatabase,
+    namespace: str,
+    collection_name: str,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str],
+    include_total: bool,
+) -> Response:
+    """
+    One page of host_vulnerabilities or host_software rows matching query.
+
+    Rows are returned in _id order with the same cursor scheme as the host
+    listing, and cached under the sync generation like it.
+    """
+    after = decode_cursor(cursor, ["_id"]) if cursor else None
+    try:
+        key = cache_key(
+            namespace,
+            await current_generation(db),
+            {
+                "query": query,
+                "limit": limit,
+                "cursor": cursor,
+                "include_total": include_total,
+            },
+        )
+        body = await response_cache.get(key)
+        if body is not None:
+            return json_body_response(body, "HIT")
+
+        collection = db[collection_name]
+        results = (
+            collection.find(
+                after_cursor(query, after, ["_id"]), {"name_lower": 0, "version_key": 0}
+            )
+            .sort("_id", ASCENDING)
+            .limit(limit + 1)
+        )
+        rows = await results.to_list(length=limit + 1)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1], ["_id"])
+
+        for row in rows:
+            row["_id"] = str(row["_id"])
+            row["host_id"] = str(row["host_id"])
+
+        response = {"status": "success", "hosts": rows, "next_cursor": next_cursor}
+        if include_total:
+            response["total"] = await collection.count_documents(query)
+
+        body = render_json(response)
+        await response_cache.set(key, body)
+        return json_body_response(body, "MISS")
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error retrieving {namespace}: {str(e)}"
+        )
+
+
+def render_json(content: Any) -> bytes:
+    """Serialize a response body like the app's default ORJSONResponse"""
+    return orjson.dumps(
+        content,
+        default=str,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+def json_body_response(body: bytes, cache_status: str) -> Response:
+    return Response(
+        content=body, media_type="application/json", headers={"X-Cache": cache_status}
+    )
+
 
 @instances_router.get("/")
 async def get_hosts(
@@ -18,37 +271,107 @@ async def get_hosts(
     is_old: Optional[bool] = Query(None),
     limit: int = Query(1, ge=1),
     skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor returned with the previous page"
+    ),
+    include_total: bool = Query(
+        False, description="Also return the number of hosts matching the filters"
+    ),
+    view: str = Query(
+        "full",
+        pattern="^(full|summary)$",
+        description="summary returns only the fields the dashboard table shows",
+    ),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return, e.g. os,last_seen"
+    ),
     db: AsyncIOMotorDatabase = Depends(get_database),
 ):
     """
     Get hosts with filtering options.
 
     Filters:
-    - operating_system: Filter hosts by their OS name
+    - operating_system: Filter hosts by their OS name. Every word of the filter
+                        must start a word of the OS name (case-insensitive).
     - is_old: When true, returns hosts last seen more than 30 days ago.
               When false, returns hosts seen within the last 30 days.
-    """
-    try:
-        query = {}
 
-        if operating_system:
-            query["os"] = {"$regex": f".*{operating_system}.*", "$options": "i"}
+    Hosts are returned in _id order, or in (last_seen, _id) order when is_old
+    is the only filter. Pass the next_cursor of a response as cursor, with the
+    same filters, to get the following page; next_cursor is null on the last
+    page. skip is still honoured, relative to the cursor when
+    both are given, but cursors stay fast on deep pages.
 
-        if is_old is not None:
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+    view=summary and fields= restrict the returned fields (_id is always
+    included); use GET /hosts/{host_id} for the full document.
 
-            if is_old:
-                query["last_seen"] = {"$lt": thirty_days_ago}
-            else:
-                query["last_seen"] = {"$gte": thirty_days_ago}
+    Responses are cached until the next sync completes or the cache TTL runs
+    out; the X-Cache header tells whether one was served from the cache.
+    """
+    sort_fields = host_sort_fields(operating_system, is_old)
+    after = decode_cursor(cursor, sort_fields) if cursor else None
+    projection = build_projection(view, fields)
+    # The cursor needs the sort fields of the last host even if not requested
+    extra_fields = []
+    if projection is not None:
+        # _id is always returned, whatever the projection
+        extra_fields = [
+            name for name in sort_fields if name != "_id" and name not in projection
+        ]
+        projection = {**projection, **{name: 1 for name in extra_fields}}
+
+    try:
+        key = cache_key(
+            "hosts",
+            await current_generation(db),
+            {
+                "operating_system": (
+                    operating_system.lower() if operating_system else None
+                ),
+                "is_old": is_old,
+                "limit": limit,
+                "skip": skip,
+                "cursor": cursor,
+                "include_total": include_total,
+                "projection": projection,
+            },
+        )
+        body = await response_cache.get(key)
+        if body is not None:
+            return json_body_response(body, "HIT")
+
+        query = build_host_query(operating_system, is_old)
+        # One extra host tells whether there is a next page
+        results = (
+            db.integrated_hosts.find(
+                after_cursor(query, after, sort_fields), projection
+            )
+            .sort([(name, ASCENDING) for name in sort_fields])
+            .skip(skip)
+            .limit(limit + 1)
+        )
+        hosts = await results.to_list(length=limit + 1)
+        next_cursor = None
+        if len(hosts) > limit:
+            hosts = hosts[:limit]
+            next_cursor = encode_cursor(hosts[-1], sort_fields)
 
-        cursor = db.integrated_hosts.find(query).skip(skip).limit(limit)
-        hosts = await cursor.to_list(length=limit)
         for host in hosts:
             if "_id" in host:
                 host["_id"] = str(host["_id"])
+            for name in extra_fields:
+                host.pop(name, None)
+
+        response = {"status": "success", "hosts": hosts, "next_cursor": next_cursor}
+        if include_total:
+            if query:
+                response["total"] = await db.integrated_hosts.count_documents(query)
+            else:
+                response["total"] = await db.integrated_hosts.estimated_document_count()
 
-        return {"status": "success", "hosts": hosts}
+        body = render_json(response)
+        await response_cache.set(key, body)
+        return json_body_response(body, "MISS")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving hosts: {str(e)}")
@@ -59,6 +382,9 @@ async def trigger_scheduled_sync(
     max_records: int = Query(
         100, description="Maximum number of records to fetch", ge=1
     ),
+    force_full: bool = Query(
+        False, description="Reprocess every host, ignoring stored fingerprints"
+    ),
 ):
     """
     Trigger the scheduled security data sync task
@@ -67,7 +393,7 @@ async def trigger_scheduled_sync(
     according to the schedule defined in Celery Beat.
     """
     try:
-        task = fetch_and_process_hosts_data.delay(max_records)
+        task = fetch_and_process_hosts_data.delay(max_records, force_full)
 
         return {
             "status": "submitted",
@@ -78,3 +404,149 @@ async def trigger_scheduled_sync(
         raise HTTPException(
             status_code=500, detail=f"Error triggering sequential processing: {str(e)}"
         )
+
+
+@instances_router.get("/stats")
+async def get_host_stats(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Fleet-level host counts: per OS, active versus stale, by highest
+    vulnerability severity and per agent version.
+
+    Served from a rollup the sync recomputes after every run, so the cost does
+    not depend on the number of hosts; computed_at tells how fresh it is.
+    """
+    try:
+        stats = await get_fleet_stats(db)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error retrieving host stats: {str(e)}"
+        )
+    return {"status": "success", "stats": stats}
+
+
+@instances_router.get("/export")
+async def export_hosts(
+    operating_system: Optional[str] = Query(None),
+    is_old: Optional[bool] = Query(None),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    compress: bool = Query(False, alias="gzip", description="gzip the response"),
+    view: str = Query("full", pattern="^(full|summary)$"),
+    fields: Optional[str] = Query(None),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Export every host matching the filters of GET /hosts as CSV or NDJSON.
+
+    The CSV has the columns of the dashboard table. NDJSON has one host
+    document per line, restricted by view= and fields= like the listing.
+    Hosts are streamed from a Mongo cursor in the order of the listing;
+    gzip=true compresses the stream with Content-Encoding: gzip.
+    """
+    query = build_host_query(operating_system, is_old)
+    if export_format == "csv":
+        projection = build_projection("full", ",".join(CSV_FIELDS))
+    else:
+        projection = build_projection(view, fields)
+
+    hosts = db.integrated_hosts.find(
+        query, projection, batch_size=EXPORT_BATCH_SIZE
+    ).sort([(name, ASCENDING) for name in host_sort_fields(operating_system, is_old)])
+
+    filename = f"host_data_{datetime.utcnow().date().isoformat()}.{export_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_chunks(hosts, export_format, compress),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers=headers,
+    )
+
+
+@instances_router.get("/vulnerabilities")
+async def get_vulnerable_hosts(
+    qid: int = Query(..., description="Qualys QID of the vulnerability"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor returned with the previous page"
+    ),
+    include_total: bool = Query(False),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Hosts affected by a vulnerability, one entry per detection.
+
+    Each entry is the vuln.list entry of the host (first_found, last_found,
+    ...) with its host_id, address and dns_host_name; GET /hosts/{host_id}
+    returns the whole host. Served by the qid index of host_vulnerabilities,
+    paged with next_cursor like GET /hosts.
+    """
+    return await lookup_page(
+        db,
+        "vulnerabilities",
+        "host_vulnerabilities",
+        {"qid": qid},
+        limit,
+        cursor,
+        include_total,
+    )
+
+
+@instances_router.get("/software")
+async def get_software_hosts(
+    name: str = Query(..., min_length=1, description="Software name, any case"),
+    version_lt: Optional[str] = Query(
+        None, description="Only versions lower than this one"
+    ),
+    version_gte: Optional[str] = Query(
+        None, description="Only versions equal to or higher than this one"
+    ),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor returned with the previous page"
+    ),
+    include_total: bool = Query(False),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+):
+    """
+    Hosts with a piece of software installed, optionally in a version range.
+
+    Versions compare part by part, numerically where parts are numbers, so
+    version_lt=3.0.10 includes 3.0.9. Each entry is the software.list entry
+    of the host with its host_id, address and dns_host_name. Served by the
+    name_version index of host_software, paged with next_cursor like GET /hosts.
+    """
+    return await lookup_page(
+        db,
+        "software",
+        "host_software",
+        software_query(name, version_lt, version_gte),
+        limit,
+        cursor,
+        include_total,
+    )
+
+
+@instances_router.get("/{host_id}")
+async def get_host(host_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
+    """Get the full merged document of one host by its _id"""
+    try:
+        object_id = ObjectId(host_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Host not found")
+
+    try:
+        key = cache_key("host", await current_generation(db), {"_id": host_id})
+        body = await response_cache.get(key)
+        if body is not None:
+            return json_body_response(body, "HIT")
+        host = await db.integrated_hosts.find_one({"_id": object_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving host: {str(e)}")
+
+    if host is None:
+        raise HTTPException(status_code=404, detail="Host not found")
+    host["_id"] = str(host["_id"])
+    body = render_json({"status": "success", "host": host})
+    await response_cache.set(key, body)
+    return json_body_response(body, "MISS")
@@ -0,0 +1,405 @@
+"""
+Local stand-in for the vendor host APIs, serving synthetic data.
+
+Implements POST /api/{crowdstrike,qualys}/hosts/get?skip=&limit= like the
+real upstream. Records are generated on demand from their index and a seed,
+so any page of a million-host fleet is served in constant memory and the
+same parameters always produce the same data.
+
+    python -m benchmarks.mock_upstream --hosts 100000 --match-ratio 0.8 --port 8080
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+OS_NAMES = (
+    ("Windows Server 2019 Datacenter", "Windows"),
+    ("Windows 10 Enterprise", "Windows"),
+    ("Windows 11 Pro", "Windows"),
+    ("Ubuntu 22.04.3 LTS", "Linux"),
+    ("Red Hat Enterprise Linux 8.8", "Linux"),
+    ("CentOS Linux 7.9", "Linux"),
+    ("macOS 14.2", "Mac"),
+)
+SOFTWARE_NAMES = (
+    "Google Chrome",
+    "Mozilla Firefox",
+    "OpenSSL",
+    "Microsoft Office",
+    "Python",
+    "Java Runtime Environment",
+    "7-Zip",
+    "Zoom",
+    "Slack",
+    "Docker Engine",
+    "nginx",
+    "PostgreSQL",
+)
+ACCOUNTS = ("root", "admin", "svc_backup", "svc_monitoring", "jdoe", "asmith")
+PORTS = ((22, "TCP"), (80, "TCP"), (443, "TCP"), (3389, "TCP"), (53, "UDP"))
+
+# Newest timestamp of the synthetic data, fixed so runs are reproducible
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class DatasetConfig:
+    """Shape of the synthetic fleet"""
+
+    hosts: int = 1000
+    # CrowdStrike fleet size; defaults to the Qualys one
+    crowdstrike_hosts: Optional[int] = None
+    # Share of Qualys hosts that have a CrowdStrike host with the same match key
+    match_ratio: float = 0.8
+    software_per_host: int = 20
+    vulns_per_host: int = 30
+    interfaces_per_host: int = 2
+    seed: int = 42
+
+    def size(self, host_type: str) -> int:
+        if host_type == "crowdstrike" and self.crowdstrike_hosts is not None:
+            return self.crowdstrike_hosts
+        return self.hosts
+
+
+def _ip(i: int) -> str:
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+
+def _mac(rng: random.Random, separator: str) -> str:
+    return separator.join(f"{rng.randrange(256):02x}" for _ in range(6))
+
+
+def _timestamp(rng: random.Random, max_days: int) -> datetime:
+    return EPOCH - timedelta(seconds=rng.randrange(max_days * 86400))
+
+
+def _iso(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _mongo_date(value: datetime) -> Dict[str, str]:
+    return {"$date": value.strftime("%Y-%m-%dT%H:%M:%S.000Z")}
+
+
+class SyntheticFleet:
+    """Deterministic synthetic host records of both sources"""
+
+    def __init__(self, config: DatasetConfig):
+        self.config = config
+
+    def _rng(self, host_type: str, i: int) -> random.Random:
+        return random.Random(f"{self.config.seed}:{host_type}:{i}")
+
+    def is_matched(self, i: int) -> bool:
+        """Whether host i of both sources shares a match key"""
+        if i >= min(self.config.size("qualys"), self.config.size("crowdstrike")):
+            return False
+        return self._rng("match", i).random() < self.config.match_ratio
+
+    def hostname(self, i: int) -> str:
+        return f"host-{i:07d}.corp.example.com"
+
+    def page(self, host_type: str, skip: int, limit: int) -> List[Dict]:
+        end = min(skip + limit, self.config.size(host_type))
+        record = self.crowdstrike if host_type == "crowdstrike" else self.qualys
+        return [record(i) for i in range(skip, end)]
+
+    def qualys(self, i: int) -> Dict:
+        rng = self._rng("qualys", i)
+        config = self.config
+        hostname = self.hostname(i)
+        address = _ip(i)
+        os_name, _ = rng.choice(OS_NAMES)
+        last_checked_in = _timestamp(rng, 60)
+
+        return {
+            "id": 100000000 + i,
+            "name": hostname,
+            "dnsHostName": hostname,
+            "fqdn": hostname,
+            "address": address,
+            "os": os_name,
+            "type": "HOST",
+            "trackingMethod": "QAGENT",
+            "totalMemory": rng.choice((4096, 8192, 16384, 32768)),
+            "timezone": "+00:00",
+            "created": _mongo_date(_timestamp(rng, 720)),
+            "modified": _mongo_date(last_checked_in),
+            "lastVulnScan": _mongo_date(_timestamp(rng, 30)),
+            "agentInfo": {
+                "agentVersion": f"5.{rng.randrange(4)}.{rng.randrange(10)}.{rng.randrange(40)}",
+                "agentId": f"{rng.getrandbits(128):032x}",
+                "status": "STATUS_ACTIVE",
+                "lastCheckedIn": _mongo_date(last_checked_in),
+            },
+            "networkInterface": {
+                "list": [
+                    {
+                        "hostAssetInterface": {
+                            "address": (
+                                address if n == 0 else _ip(rng.randrange(1 << 24))
+                            ),
+                            "hostname": hostname,
+                            "interfaceName": f"eth{n}",
+                            "macAddress": _mac(rng, ":").upper(),
+                            "gatewayAddress": "10.0.0.1",
+                        }
+                    }
+                    for n in range(config.interfaces_per_host)
+                ]
+            },
+            "software": {
+                "list": [
+                    {
+                        "hostAssetSoftware": {
+                            "name": f"{rng.choice(SOFTWARE_NAMES)} {n}",
+                            "version": f"{rng.randrange(1, 30)}.{rng.randrange(10)}.{rng.randrange(100)}",
+                        }
+                    }
+                    for n in range(config.software_per_host)
+                ]
+            },
+            "vuln": {
+                "list": [
+                    {
+                        "hostAssetVuln": {
+                            "qid": rng.randrange(10000, 400000),
+                            "hostInstanceVulnId": {
+                                "$numberLong": str(rng.getrandbits(40))
+                            },
+                            "firstFound": _mongo_date(_timestamp(rng, 365)),
+                            "lastFound": _mongo_date(_timestamp(rng, 30)),
+                        }
+                    }
+                    for _ in range(config.vulns_per_host)
+                ]
+            },
+            "account": {
+                "list": [
+                    {"hostAssetAccount": {"username": username}}
+                    for username in rng.sample(ACCOUNTS, 3)
+                ]
+            },
+            "openPort": {
+                "list": [
+                    {
+                        "hostAssetOpenPort": {
+                            "port": port,
+                            "protocol": protocol,
+                            "serviceName": "",
+                        }
+                    }
+                    for port, protocol in rng.sample(PORTS, 2)
+                ]
+            },
+            "tags": {
+                "list": [
+                    {"tagSimple": {"id": 1000 + n, "name": f"tag-{n}"}}
+                    for n in rng.sample(range(20), 2)
+                ]
+            },
+        }
+
+    def crowdstrike(self, i: int) -> Dict:
+        rng = self._rng("crowdstrike", i)
+        if self.is_matched(i):
+            hostname, local_ip = self.hostname(i), _ip(i)
+        else:
+            hostname, local_ip = f"cs-{i:07d}.corp.example.com", _ip(i + (1 << 23))
+        os_version, platform_name = rng.choice(OS_NAMES)
+        first_seen = _timestamp(rng, 720)
+        last_seen = _timestamp(rng, 60)
+
+        return {
+            "device_id": f"{rng.getrandbits(128):032x}",
+            "cid": f"{self.config.seed:032x}",
+            "hostname": hostname,
+            "local_ip": local_ip,
+            "external_ip": f"203.0.113.{rng.randrange(256)}",
+            "mac_address": _mac(rng, "-"),
+            "os_version": os_version,
+            "platform_name": platform_name,
+            "agent_version": f"7.{rng.randrange(5, 12)}.{rng.randrange(20000)}.0",
+            "system_manufacturer": rng.choice(("Dell Inc.", "HP", "Lenovo", "VMware")),
+            "product_type_desc": rng.choice(("Server", "Workstation")),
+            "status": "normal",
+            "first_seen": _iso(first_seen),
+            "last_seen": _iso(last_seen),
+            "modified_timestamp": _mongo_date(last_seen),
+            "policies": [
+                {
+                    "policy_type": policy_type,
+                    "policy_id": f"{rng.getrandbits(128):032x}",
+                    "applied": True,
+                }
+                for policy_type in ("prevention", "sensor-update")
+            ],
+            "tags": [],
+        }
+
+
+@dataclass
+class FaultConfig:
+    """Latency and error injection"""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Share of requests answered with 503 and with 429 + Retry-After
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+
+
+def make_handler(fleet: SyntheticFleet, faults: FaultConfig):
+    class MockUpstreamHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            length = int(self.headers.get("Content-Length") or 0)
+            if length:
+                self.rfile.read(length)
+            if (
+                len(parts) != 4
+                or parts[0] != "api"
+                or parts[1] not in ("crowdstrike", "qualys")
+                or parts[2:] != ["hosts", "get"]
+            ):
+                self._reply(404, {"detail": "Not Found"})
+                return
+
+            query = parse_qs(url.query)
+            try:
+                skip = int(query.get("skip", ["0"])[0])
+                limit = int(query.get("limit", ["1"])[0])
+            except ValueError:
+                self._reply(422, {"detail": "skip and limit must be integers"})
+                return
+
+            if faults.latency_ms or faults.jitter_ms:
+                time.sleep(
+                    (faults.latency_ms + random.uniform(0, faults.jitter_ms)) / 1000
+                )
+            roll = random.random()
+            if roll < faults.error_rate:
+                self._reply(503, {"detail": "Service Unavailable"})
+                return
+            if roll < faults.error_rate + faults.throttle_rate:
+                self._reply(
+                    429,
+                    {"detail": "Too Many Requests"},
+                    {"Retry-After": f"{faults.retry_after:g}"},
+                )
+                return
+
+            self._reply(200, fleet.page(parts[1], skip, limit))
+
+        def _reply(self, status: int, body, headers: Optional[Dict] = None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    return MockUpstreamHandler
+
+
+def start_server(
+    dataset: DatasetConfig,
+    faults: Optional[FaultConfig] = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> ThreadingHTTPServer:
+    """Serve the synthetic fleet from a daemon thread; port 0 picks a free port"""
+    server = ThreadingHTTPServer(
+        (host, port), make_handler(SyntheticFleet(dataset), faults or FaultConfig())
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = DatasetConfig()
+    parser.add_argument("--hosts", type=int, default=defaults.hosts)
+    parser.add_argument("--crowdstrike-hosts", type=int, default=None)
+    parser.add_argument("--match-ratio", type=float, default=defaults.match_ratio)
+    parser.add_argument("--software", type=int, default=defaults.software_per_host)
+    parser.add_argument("--vulns", type=int, default=defaults.vulns_per_host)
+    parser.add_argument("--interfaces", type=int, default=defaults.interfaces_per_host)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def dataset_from_arguments(args: argparse.Namespace) -> DatasetConfig:
+    return DatasetConfig(
+        hosts=args.hosts,
+        crowdstrike_hosts=args.crowdstrike_hosts,
+        match_ratio=args.match_ratio,
+        software_per_host=args.software,
+        vulns_per_host=args.vulns,
+        interfaces_per_host=args.interfaces,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_dataset_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    dataset = dataset_from_arguments(args)
+    faults = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+    )
+    server = ThreadingHTTPServer(
+        (args.host, args.port), make_handler(SyntheticFleet(dataset), faults)
+    )
+    server.daemon_threads = True
+    logger.info(
+        f"Serving synthetic fleet on http://{args.host}:{server.server_port} "
+        f"({json.dumps(asdict(dataset))}, {json.dumps(asdict(faults))})"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+End-to-end sync benchmark on synthetic data from the mock upstream.
+
+Times each sync stage on the same seeded fleet and records throughput and
+peak traced memory per stage as JSON. A run can be compared to a saved
+baseline, failing when a stage got slower than the allowed margin.
+
+    python -m benchmarks.run --hosts 10000 --output results.json
+    python -m benchmarks.run --hosts 10000 --compare results.json
+
+The Mongo stages write to a scratch database (silk_benchmark by default)
+that is dropped afterwards; they are skipped when Mongo is unreachable.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from core.api_client import SilkApiClient
+from core.config import settings
+from core.database import Database, ensure_indexes
+from core.derived import add_derived_fields
+from core.matching import match_hosts
+from core.scripts import (
+    find_duplicates,
+    merge_data,
+    normalize_source,
+    normalize_sources,
+    process_value,
+)
+from core.tasks import process_data
+from core.writer import BulkHostWriter
+
+from .mock_upstream import DatasetConfig, add_dataset_arguments, dataset_from_arguments
+
+logger = logging.getLogger(__name__)
+
+RESULTS_VERSION = 1
+
+# Collections the Mongo stages write to in the scratch database
+SCRATCH_COLLECTIONS = ("integrated_hosts", "host_fingerprints", "sync_state")
+
+
+def measure(
+    func: Callable[[], Any],
+    records: int,
+    repeat: int,
+    trace_memory: bool,
+    setup: Optional[Callable[[], None]] = None,
+) -> Tuple[Dict[str, Any], Any]:
+    """
+    Time func over repeat runs and, in one extra traced run, its peak memory.
+
+    Timed runs are not traced since tracemalloc slows allocation-heavy code
+    down several times. Returns the stage result and the last return value.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+
+    peak_memory_mb = None
+    if trace_memory:
+        if setup is not None:
+            setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak_memory_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+
+    seconds = statistics.median(timings)
+    return {
+        "records": records,
+        "seconds": round(seconds, 4),
+        "min_seconds": round(min(timings), 4),
+        "max_seconds": round(max(timings), 4),
+        "records_per_second": round(records / seconds, 1) if seconds else None,
+        "peak_memory_mb": peak_memory_mb,
+    }, result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_upstream(dataset: DatasetConfig, timeout: float = 30.0):
+    """
+    Run the mock upstream in a child process, so that generating responses
+    does not compete with the client under test for the GIL.
+    """
+    port = _free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.mock_upstream",
+        "--port",
+        str(port),
+        "--hosts",
+        str(dataset.hosts),
+        "--match-ratio",
+        str(dataset.match_ratio),
+        "--software",
+        str(dataset.software_per_host),
+        "--vulns",
+        str(dataset.vulns_per_host),
+        "--interfaces",
+        str(dataset.interfaces_per_host),
+        "--seed",
+        str(dataset.seed),
+    ]
+    if dataset.crowdstrike_hosts is not None:
+        command += ["--crowdstrike-hosts", str(dataset.crowdstrike_hosts)]
+    process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Mock upstream exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Mock upstream did not start in time")
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def _mongo_available(mongo_url: str) -> Optional[str]:
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+        return None
+    except Exception as e:
+        return str(e)
+    finally:
+        client.close()
+
+
+async def _reset_scratch(mongo_url: str, database: str) -> None:
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        db = client[database]
+        for name in SCRATCH_COLLECTIONS:
+            await db.drop_collection(name)
+        await ensure_indexes(db)
+    finally:
+        client.close()
+
+
+async def _drop_scratch(mongo_url: str, database: str) -> None:
+    client = AsyncIOMotorClient(mongo_url)
+    try:
+        await client.drop_database(database)
+    finally:
+        client.close()
+
+
+async def _run_process_data(
+    mongo_url: str, database: str, crowdstrike: List[Dict], qualys: List[Dict]
+) -> Dict[str, int]:
+    client = AsyncIOMotorClient(mongo_url, **Database.get_client_options())
+    try:
+        return await process_data(
+            client[database],
+            crowdstrike,
+            qualys,
+            force_full=True,
+            stop_at_watermark=False,
+        )
+    finally:
+        client.close()
+
+
+async def _run_write(mongo_url: str, database: str, documents: List[Dict]) -> Dict:
+    client = AsyncIOMotorClient(mongo_url, **Database.get_client_options())
+    try:
+        writer = BulkHostWriter(
+            client[database].integrated_hosts,
+            batch_size=settings.sync.write_batch_size,
+        )
+        for document in documents:
+            await writer.add(document)
+        await writer.flush()
+        return writer.stats()
+    finally:
+        client.close()
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    dataset = dataset_from_arguments(args)
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    def record(name: str, stage: Dict[str, Any]) -> None:
+        stages[name] = stage
+        logger.warning(
+            f"{name}: {stage['records']} records in {stage['seconds']}s "
+            f"({stage['records_per_second']}/s, peak {stage['peak_memory_mb']} MB)"
+        )
+
+    process = None
+    upstream = args.upstream
+    if upstream is None:
+        process, upstream = start_upstream(dataset)
+    try:
+        client = SilkApiClient(
+            upstream,
+            token="benchmark",
+            page_size=args.page_size,
+            max_in_flight=args.max_in_flight,
+        )
+        max_records = max(dataset.size("crowdstrike"), dataset.size("qualys"))
+        with client:
+            stage, fetched = measure(
+                lambda: client.fetch_all_hosts(max_records),
+                dataset.size("crowdstrike") + dataset.size("qualys"),
+                args.repeat,
+                args.trace_memory,
+            )
+        record("fetch_all_hosts", stage)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    crowdstrike, qualys = fetched["crowdstrike"], fetched["qualys"]
+    records = crowdstrike + qualys
+
+    stage, _ = measure(
+        lambda: [process_value(record) for record in records],
+        len(records),
+        args.repeat,
+        args.trace_memory,
+    )
+    record("process_value", stage)
+
+    stage, _ = measure(
+        lambda: [normalize_source(record, "crowdstrike") for record in crowdstrike]
+        + [normalize_source(record, "qualys") for record in qualys],
+        len(records),
+        args.repeat,
+        args.trace_memory,
+    )
+    record("normalize_source", stage)
+
+    # The pipeline normalizes the matched records of a page as one batch
+    def normalize_pages(records, host_type):
+        for start in range(0, len(records), args.page_size):
+            normalize_sources(records[start : start + args.page_size], host_type)
+
+    stage, _ = measure(
+        lambda: (
+            normalize_pages(crowdstrike, "crowdstrike"),
+            normalize_pages(qualys, "qualys"),
+        ),
+        len(records),
+        args.repeat,
+        args.trace_memory,
+    )
+    record("normalize_sources", stage)
+
+    stage, matches = measure(
+        lambda: list(
+            match_hosts(
+                crowdstrike,
+                qualys,
+                settings.sync.match_mode,
+                threshold=settings.sync.match_threshold,
+                max_block_size=settings.sync.match_max_block_size,
+            )
+        ),
+        len(records),
+        args.repeat,
+        args.trace_memory,
+    )
+    record("match_hosts", stage)
+
+    pairs = [(q, c) for q, c, _ in matches]
+    normalized_pairs = [
+        (normalize_source(q, "qualys"), normalize_source(c, "crowdstrike"))
+        for q, c in pairs
+    ]
+    stage, _ = measure(
+        lambda: [find_duplicates(q, c) for q, c in normalized_pairs],
+        len(pairs),
+        args.repeat,
+        args.trace_memory,
+    )
+    record("find_duplicates", stage)
+
+    stage, merged = measure(
+        lambda: [merge_data(q, c) for q, c in pairs],
+        len(pairs),
+        args.repeat,
+        args.trace_memory,
+    )
+    record("merge_data", stage)
+
+    mongo_url = args.mongo_url or Database.get_mongo_url()
+    unavailable = asyncio.run(_mongo_available(mongo_url))
+    if unavailable:
+        logger.warning(f"Skipping Mongo stages, Mongo is unreachable: {unavailable}")
+        stages["process_data"] = stages["mongo_write"] = {"skipped": unavailable}
+    else:
+        reset = lambda: asyncio.run(_reset_scratch(mongo_url, args.mongo_db))
+        try:
+            stage, _ = measure(
+                lambda: asyncio.run(
+                    _run_process_data(mongo_url, args.mongo_db, crowdstrike, qualys)
+                ),
+                len(records),
+                args.repeat,
+                args.trace_memory,
+                setup=reset,
+            )
+            record("process_data", stage)
+
+            documents = [add_derived_fields(document) for document in merged]
+            stage, _ = measure(
+                lambda: asyncio.run(_run_write(mongo_url, args.mongo_db, documents)),
+                len(documents),
+                args.repeat,
+                args.trace_memory,
+                setup=reset,
+            )
+            record("mongo_write", stage)
+        finally:
+            asyncio.run(_drop_scratch(mongo_url, args.mongo_db))
+
+    return {
+        "version": RESULTS_VERSION,
+        "params": {
+            **asdict(dataset),
+            "page_size": args.page_size,
+            "max_in_flight": args.max_in_flight,
+            "repeat": args.repeat,
+            "match_mode": settings.sync.match_mode,
+            "matched_pairs": len(pairs),
+        },
+        "environment": environment(),
+        "stages": stages,
+    }
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float) -> bool:
+    """Print throughput changes against a baseline; False if a stage regressed"""
+    if current["params"] != baseline["params"]:
+        print("Runs are not comparable, parameters differ:")
+        for name in sorted(set(current["params"]) | set(baseline["params"])):
+            if current["params"].get(name) != baseline["params"].get(name):
+                print(
+                    f"  {name}: baseline {baseline['params'].get(name)}, "
+                    f"current {current['params'].get(name)}"
+                )
+        return False
+
+    ok = True
+    print(
+        f"{'stage':<18}{'baseline/s':>14}{'current/s':>14}{'change':>9}{'peak MB':>16}"
+    )
+    for name, stage in current["stages"].items():
+        before = baseline["stages"].get(name, {})
+        if "records_per_second" not in stage or "records_per_second" not in before:
+            print(f"{name:<18}{'skipped':>14}")
+            continue
+        change = stage["records_per_second"] / before["records_per_second"] - 1
+        regressed = change < -max_regression
+        ok = ok and not regressed
+        memory = f"{before.get('peak_memory_mb')} -> {stage.get('peak_memory_mb')}"
+        print(
+            f"{name:<18}{before['records_per_second']:>14}"
+            f"{stage['records_per_second']:>14}{change:>+9.1%}{memory:>16}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_dataset_arguments(parser)
+    parser.add_argument(
+        "--upstream", help="URL of a running mock upstream instead of starting one"
+    )
+    parser.add_argument("--page-size", type=int, default=settings.api.page_size)
+    parser.add_argument("--max-in-flight", type=int, default=settings.api.max_in_flight)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--match-mode",
+        choices=("exact", "scored"),
+        help="Defaults to SYNC_MATCH_MODE",
+    )
+    parser.add_argument(
+        "--no-memory",
+        dest="trace_memory",
+        action="store_false",
+        help="Skip the traced run measuring peak memory",
+    )
+    parser.add_argument("--mongo-url", help="Defaults to the MONGO_* settings")
+    parser.add_argument("--mongo-db", default="silk_benchmark")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.1,
+        help="Allowed throughput drop per stage when comparing (0.1 = 10%%)",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    if args.match_mode:
+        settings.sync.match_mode = args.match_mode
+    results = run_benchmarks(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,151 @@
 import logging
+import random
+import threading
+import time
 import requests
-from typing import Dict, List, Any
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, Any, Optional
 from urllib.parse import urljoin
 
 from requests import HTTPError
+from requests.adapters import HTTPAdapter
+
+from .metrics import (
+    API_CONCURRENCY_LIMIT,
+    API_RETRIES,
+    FETCH_PAGE_SECONDS,
+    RECORDS_FETCHED,
+)
 
 logger = logging.getLogger(__name__)
 
+HOST_TYPES = ("crowdstrike", "qualys")
+
+# Responses worth retrying; any other error status still means end of data
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Bodies cut short or garbled in transit, retried like connection errors
+TRUNCATED_BODY_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+    requests.exceptions.JSONDecodeError,
+)
+
+
+class UpstreamUnavailableError(Exception):
+    """A page could not be fetched because the upstream kept failing"""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given in seconds or as a date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AimdLimiter:
+    """
+    Adaptive limit on the in-flight requests to one upstream source.
+
+    The limit follows additive increase / multiplicative decrease: a request
+    that succeeds without being much slower than the recent average raises it
+    by 1/limit, about one per window of requests, while a throttled, failed,
+    timed out or slow request halves it. Decreases are spaced by the average
+    latency so that one burst of failures only counts once. A Retry-After
+    pause holds every new request back until it has passed.
+    """
+
+    # A request slower than this many times the average latency counts as congestion
+    LATENCY_TOLERANCE = 2.0
+    LATENCY_SMOOTHING = 0.1
+
+    def __init__(self, source: str, max_limit: int, min_limit: int = 1):
+        self.source = source
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self._concurrency_total = 0
+        self._average_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+        API_CONCURRENCY_LIMIT.labels(source=source).set(self.limit)
+
+    def acquire(self) -> None:
+        with self._condition:
+            while True:
+                paused = self._paused_until - time.monotonic()
+                if paused > 0:
+                    self._condition.wait(paused)
+                elif self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    break
+            self.in_flight += 1
+            self.requests += 1
+            self._concurrency_total += self.in_flight
+
+    def release(self, latency: Optional[float], success: bool) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            slow = False
+            if latency is not None:
+                if self._average_latency is None:
+                    self._average_latency = latency
+                slow = latency > self._average_latency * self.LATENCY_TOLERANCE
+                self._average_latency += self.LATENCY_SMOOTHING * (
+                    latency - self._average_latency
+                )
+
+            now = time.monotonic()
+            if success and not slow:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif now - self._last_decrease >= (self._average_latency or 0):
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+            API_CONCURRENCY_LIMIT.labels(source=self.source).set(self.limit)
+            self._condition.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        with self._condition:
+            self.throttled += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def record_retry(self) -> None:
+        with self._condition:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                # Average number of requests in flight when one was sent
+                "effective_concurrency": (
+                    round(self._concurrency_total / self.requests, 2)
+                    if self.requests
+                    else 0.0
+                ),
+                "concurrency_limit": round(self.limit, 2),
+            }
+
 
 class SilkApiClient:
     """Client for fetching security data from APIs"""
@@ -15,9 +154,45 @@ class SilkApiClient:
         self,
         base_url: str,
         token: str,
+        page_size: int = 100,
+        max_in_flight: int = 4,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
     ):
         self.base_url = base_url
         self.headers = {"accept": "application/json", "token": token}
+        self.page_size = page_size
+        self.max_in_flight = max_in_flight
+        self.timeout = (connect_timeout, timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiters = {
+            host_type: AimdLimiter(host_type, max_in_flight) for host_type in HOST_TYPES
+        }
+
+        # One keep-alive pool shared by every page request, sized so that all
+        # sources can have max_in_flight requests open at the same time.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=len(HOST_TYPES),
+            pool_maxsize=max_in_flight * len(HOST_TYPES),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "SilkApiClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
     def _make_request(
         self, endpoint: str, method: str = "GET", params: Dict = None, data: Any = None
@@ -25,10 +200,10 @@ class SilkApiClient:
         url = urljoin(self.base_url, endpoint)
         try:
             if method.upper() == "GET":
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self.session.get(url, params=params, timeout=self.timeout)
             elif method.upper() == "POST":
-                response = requests.post(
-                    url, headers=self.headers, params=params, json=data
+                response = self.session.post(
+                    url, params=params, json=data, timeout=self.timeout
                 )
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
@@ -39,33 +214,158 @@ class SilkApiClient:
             logger.error(f"API request error: {str(e)}")
             raise
 
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number attempt + 1"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
     def fetch_hosts(self, host_type: str, skip: int = 0, limit: int = 1) -> Dict | None:
+        """
+        Fetch one page of hosts.
+
+        Timeouts, connection errors, truncated or undecodable bodies, 429 and
+        5xx responses are retried with backoff, waiting at least as long as a Retry-After header asks; if the
+        upstream still fails, UpstreamUnavailableError is raised instead of
+        the page being taken for the end of the data. Other error statuses
+        return None, which ends the source as before.
+        """
         endpoint = f"/api/{host_type}/hosts/get"
         params = {"skip": skip, "limit": limit}
+        limiter = self.limiters[host_type]
+
+        logger.debug("Fetching %s hosts (skip=%s, limit=%s)", host_type, skip, limit)
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            # What the slot is released with, whichever way the request ends
+            latency, success = None, False
+            limiter.acquire()
+            start = time.perf_counter()
+            try:
+                data = self._make_request(
+                    endpoint, method="POST", params=params, data={}
+                )
+            except HTTPError as e:
+                latency = time.perf_counter() - start
+                status = e.response.status_code
+                if status not in TRANSIENT_STATUS_CODES:
+                    success = True
+                    logger.error(f"API request error: {str(e)}")
+                    return None
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                if retry_after:
+                    limiter.pause(retry_after)
+                reason = str(status)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                reason = "timeout" if isinstance(e, requests.Timeout) else "connection"
+            except TRUNCATED_BODY_ERRORS:
+                reason = "truncated"
+            else:
+                latency = time.perf_counter() - start
+                success = True
+                FETCH_PAGE_SECONDS.labels(source=host_type).observe(latency)
+                if data:
+                    RECORDS_FETCHED.labels(source=host_type).inc(len(data))
+                return data
+            finally:
+                limiter.release(latency, success=success)
+
+            if attempt == self.max_retries:
+                raise UpstreamUnavailableError(
+                    f"Giving up on {host_type} hosts (skip={skip}) after "
+                    f"{attempt + 1} attempts, last failure: {reason}"
+                )
+            delay = max(retry_after or 0.0, self._backoff(attempt))
+            limiter.record_retry()
+            API_RETRIES.labels(source=host_type, reason=reason).inc()
+            logger.warning(
+                f"Retrying {host_type} hosts (skip={skip}) in {delay:.2f}s "
+                f"after {reason} (attempt {attempt + 1} of {self.max_retries})"
+            )
+            time.sleep(delay)
+
+    def fetch_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, retries and effective concurrency per source"""
+        return {
+            host_type: limiter.stats() for host_type, limiter in self.limiters.items()
+        }
+
+    def iter_host_pages(
+        self,
+        host_type: str,
+        max_records: int = 100,
+        executor: ThreadPoolExecutor | None = None,
+    ) -> Iterator[List[Dict]]:
+        """
+        Yield pages of hosts for one source, in upstream order.
+
+        Up to max_in_flight pages are requested ahead of the consumer. Fetching
+        stops at the first empty or short page, or once max_records hosts have
+        been yielded.
+        """
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+
+        offsets = iter(range(0, max_records, self.page_size))
+        pending = {}
+        next_page = 0
+        submitted = 0
+
+        def submit_next() -> bool:
+            nonlocal submitted
+            skip = next(offsets, None)
+            if skip is None:
+                return False
+            limit = min(self.page_size, max_records - skip)
+            pending[submitted] = (
+                executor.submit(self.fetch_hosts, host_type, skip, limit),
+                limit,
+            )
+            submitted += 1
+            return True
 
-        logger.info(f"Fetching {host_type} hosts (skip={skip}, limit={limit})")
         try:
-            data = self._make_request(endpoint, method="POST", params=params, data={})
-        except HTTPError as e:
-            logger.error(f"API request error: {str(e)}")
-            return None
-        return data
+            while len(pending) < self.max_in_flight and submit_next():
+                pass
 
-    def fetch_all_hosts(self, max_records: int = 100) -> Dict[str, List[Dict]]:
-        crowdstrike_hosts = []
-        qualys_hosts = []
+            while next_page in pending:
+                future, limit = pending.pop(next_page)
+                next_page += 1
+
+                batch = future.result()
+                if not batch:
+                    break
 
-        for skip in range(0, max_records):
-            batch = self.fetch_hosts("crowdstrike", skip=skip, limit=1)
-            if not batch:
-                break
+                yield batch
 
-            crowdstrike_hosts.extend(batch)
+                if len(batch) < limit:
+                    break
+                submit_next()
+        finally:
+            for future, _ in pending.values():
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=True)
 
-        for skip in range(0, max_records):
-            batch = self.fetch_hosts("qualys", skip=skip, limit=1)
-            if not batch:
-                break
-            qualys_hosts.extend(batch)
+    def fetch_source(
+        self,
+        host_type: str,
+        max_records: int = 100,
+        executor: ThreadPoolExecutor | None = None,
+    ) -> List[Dict]:
+        hosts = []
+        for batch in self.iter_host_pages(host_type, max_records, executor):
+            hosts.extend(batch)
+        return hosts
 
-        return {"crowdstrike": crowdstrike_hosts, "qualys": qualys_hosts}
+    def fetch_all_hosts(self, max_records: int = 100) -> Dict[str, List[Dict]]:
+        """Fetch every source concurrently, each with its own in-flight window"""
+        with ThreadPoolExecutor(
+            max_workers=self.max_in_flight * len(HOST_TYPES)
+        ) as pages, ThreadPoolExecutor(max_workers=len(HOST_TYPES)) as sources:
+            futures = {
+                host_type: sources.submit(
+                    self.fetch_source, host_type, max_records, pages
+                )
+                for host_type in HOST_TYPES
+            }
+            return {host_type: future.result() for host_type, future in futures.items()}
@@ -0,0 +1,129 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+from .config import CacheConfig, settings
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# sync_state document holding the cache generation
+GENERATION_ID = "cache_generation"
+
+REDIS_KEY_PREFIX = "silk:cache:"
+
+
+def cache_key(namespace: str, generation: int, params: Dict[str, Any]) -> str:
+    """Stable key of a request; parameters left at None are ignored"""
+    normalized = {name: value for name, value in params.items() if value is not None}
+    return f"{namespace}:{generation}:" + json.dumps(
+        normalized, sort_keys=True, default=str
+    )
+
+
+async def current_generation(db) -> int:
+    entry = await db.sync_state.find_one({"_id": GENERATION_ID})
+    return entry["value"] if entry else 0
+
+
+async def bump_generation(db) -> None:
+    """Invalidate every cached response by moving to a new generation"""
+    await db.sync_state.update_one(
+        {"_id": GENERATION_ID}, {"$inc": {"value": 1}}, upsert=True
+    )
+
+
+class ResponseCache:
+    """
+    Read-through cache of rendered response bodies.
+
+    Entries live in a per-process LRU with a TTL and, when a Redis client is
+    given, in Redis so that API processes share them. Keys carry the cache
+    generation, which the sync bumps once it has written, so entries from
+    before a sync are never served again and simply age out.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: int = 60,
+        max_entries: int = 256,
+        max_entry_bytes: int = 1048576,
+        redis_client: Optional[redis.Redis] = None,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.redis = redis_client
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config: CacheConfig) -> "ResponseCache":
+        return cls(
+            enabled=config.enabled,
+            ttl=config.ttl,
+            max_entries=config.max_entries,
+            max_entry_bytes=config.max_entry_bytes,
+            redis_client=(
+                redis.Redis.from_url(config.redis_url) if config.redis_url else None
+            ),
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, body = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.labels(layer="memory", result="hit").inc()
+                return body
+            del self._entries[key]
+        CACHE_REQUESTS.labels(layer="memory", result="miss").inc()
+
+        if self.redis is None:
+            return None
+        try:
+            body = await self.redis.get(REDIS_KEY_PREFIX + key)
+        except Exception as e:
+            logger.warning(f"Failed to read cached response from Redis: {str(e)}")
+            return None
+        CACHE_REQUESTS.labels(
+            layer="redis", result="miss" if body is None else "hit"
+        ).inc()
+        if body is not None:
+            self._store(key, body)
+        return body
+
+    async def set(self, key: str, body: bytes) -> None:
+        if not self.enabled or len(body) > self.max_entry_bytes:
+            return
+
+        self._store(key, body)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(REDIS_KEY_PREFIX + key, body, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to write cached response to Redis: {str(e)}")
+
+    def _store(self, key: str, body: bytes) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def close(self) -> None:
+        self._entries.clear()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+
+response_cache = ResponseCache.from_config(settings.cache)
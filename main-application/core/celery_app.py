@@ -1,6 +1,15 @@
+import logging
 import os
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown, worker_ready
+
+from .config import settings
+from .metrics import mark_process_dead, start_worker_metrics_server
+from .runtime import worker_runtime
+
+logger = logging.getLogger(__name__)
 
 celery_app = Celery(
     "security_data_processor",
@@ -30,3 +39,21 @@ celery_app.conf.beat_schedule = {
         "args": (100,),
     },
 }
+
+
+@worker_process_init.connect
+def start_worker_runtime(**kwargs):
+    """Give each worker process its own event loop and MongoDB client"""
+    worker_runtime.start()
+
+
+@worker_process_shutdown.connect
+def stop_worker_runtime(pid, **kwargs):
+    worker_runtime.stop()
+    mark_process_dead(pid)
+
+
+@worker_ready.connect
+def start_metrics_server(**kwargs):
+    """Expose the metrics of all worker processes on METRICS_WORKER_PORT"""
+    start_worker_metrics_server(settings.metrics.worker_port)
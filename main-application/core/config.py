@@ -11,6 +11,23 @@ class DatabaseConfig(BaseModel):
     user: str = Field(default=os.environ.get("MONGODB_USER", ""))
     password: str = Field(default=os.environ.get("MONGO_PASSWORD", ""))
     database: str = Field(default=os.environ.get("MONGODB_DB", "silk_db"))
+    max_pool_size: int = Field(
+        default=int(os.environ.get("MONGO_MAX_POOL_SIZE", "50")), ge=1
+    )
+    min_pool_size: int = Field(
+        default=int(os.environ.get("MONGO_MIN_POOL_SIZE", "0")), ge=0
+    )
+    server_selection_timeout_ms: int = Field(
+        default=int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+        ge=1,
+    )
+    connect_timeout_ms: int = Field(
+        default=int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", "20000")), ge=1
+    )
+    # 0 waits for replies indefinitely, the driver default
+    socket_timeout_ms: int = Field(
+        default=int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "0")), ge=0
+    )
 
 
 class ApiConfig(BaseModel):
@@ -18,6 +35,111 @@ class ApiConfig(BaseModel):
 
     api_url: str = Field(default=os.environ.get("API_BASE_URL", ""))
     api_key: str = Field(default=os.environ.get("API_TOKEN", ""))
+    page_size: int = Field(default=int(os.environ.get("API_PAGE_SIZE", "100")), ge=1)
+    max_in_flight: int = Field(
+        default=int(os.environ.get("API_MAX_IN_FLIGHT", "4")), ge=1
+    )
+    timeout: float = Field(default=float(os.environ.get("API_TIMEOUT", "30")), gt=0)
+    connect_timeout: float = Field(
+        default=float(os.environ.get("API_CONNECT_TIMEOUT", "5")), gt=0
+    )
+    max_retries: int = Field(default=int(os.environ.get("API_MAX_RETRIES", "5")), ge=0)
+    backoff_base: float = Field(
+        default=float(os.environ.get("API_BACKOFF_BASE", "0.5")), ge=0
+    )
+    backoff_max: float = Field(
+        default=float(os.environ.get("API_BACKOFF_MAX", "30")), ge=0
+    )
+
+
+class SyncConfig(BaseModel):
+    """Host sync pipeline configuration"""
+
+    write_batch_size: int = Field(
+        default=int(os.environ.get("SYNC_WRITE_BATCH_SIZE", "500")), ge=1
+    )
+    # The queues bound the Qualys side and everything downstream of matching.
+    # They do not bound the CrowdStrike side: it is indexed in full before the
+    # first Qualys page is probed, raw records included, so a sync task holds
+    # every CrowdStrike record it was given (about 2 KiB per host on the
+    # benchmark fleet, more with real records). Sharding is the cap: with
+    # SYNC_SHARDS above 1 each shard task indexes only its shard, about
+    # 1/SYNC_SHARDS of the fleet. Scored matching runs unsharded and always
+    # indexes the whole fleet.
+    page_queue_size: int = Field(
+        default=int(os.environ.get("SYNC_PAGE_QUEUE_SIZE", "2")), ge=1
+    )
+    queue_size: int = Field(default=int(os.environ.get("SYNC_QUEUE_SIZE", "100")), ge=1)
+    incremental: bool = Field(
+        default=os.environ.get("SYNC_INCREMENTAL", "true").lower() == "true"
+    )
+    stop_at_watermark: bool = Field(
+        default=os.environ.get("SYNC_STOP_AT_WATERMARK", "false").lower() == "true"
+    )
+    # Above 1, the sync is split into this many shard tasks run in parallel
+    shards: int = Field(default=int(os.environ.get("SYNC_SHARDS", "1")), ge=1)
+    stage_batch_size: int = Field(
+        default=int(os.environ.get("SYNC_STAGE_BATCH_SIZE", "100")), ge=1
+    )
+    staging_ttl: int = Field(
+        default=int(os.environ.get("SYNC_STAGING_TTL", "86400")), ge=1
+    )
+    shard_max_retries: int = Field(
+        default=int(os.environ.get("SYNC_SHARD_MAX_RETRIES", "3")), ge=0
+    )
+    # Above 0, normalize and merge run in a pool of this many processes
+    merge_processes: int = Field(
+        default=int(os.environ.get("SYNC_MERGE_PROCESSES", "0")), ge=0
+    )
+    merge_chunk_size: int = Field(
+        default=int(os.environ.get("SYNC_MERGE_CHUNK_SIZE", "64")), ge=1
+    )
+    # Maintain the host_vulnerabilities and host_software collections
+    host_details: bool = Field(
+        default=os.environ.get("SYNC_HOST_DETAILS", "true").lower() == "true"
+    )
+    # "exact" pairs hosts on (address, hostname); "scored" on weighted
+    # hostname, IP and MAC keys, and runs unsharded
+    match_mode: str = Field(
+        default=os.environ.get("SYNC_MATCH_MODE", "exact"), pattern="^(exact|scored)$"
+    )
+    match_threshold: int = Field(
+        default=int(os.environ.get("SYNC_MATCH_THRESHOLD", "3")), ge=1
+    )
+    match_max_block_size: int = Field(
+        default=int(os.environ.get("SYNC_MATCH_MAX_BLOCK_SIZE", "50")), ge=1
+    )
+
+
+class MetricsConfig(BaseModel):
+    """Metrics exposition configuration"""
+
+    worker_port: int = Field(default=int(os.environ.get("METRICS_WORKER_PORT", "9808")))
+
+
+class CacheConfig(BaseModel):
+    """Host query response cache configuration"""
+
+    enabled: bool = Field(
+        default=os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+    )
+    ttl: int = Field(default=int(os.environ.get("CACHE_TTL", "60")), ge=1)
+    max_entries: int = Field(
+        default=int(os.environ.get("CACHE_MAX_ENTRIES", "256")), ge=1
+    )
+    max_entry_bytes: int = Field(
+        default=int(os.environ.get("CACHE_MAX_ENTRY_BYTES", "1048576")), ge=1
+    )
+    # Optional shared layer; leave empty to cache in each API process only
+    redis_url: str = Field(default=os.environ.get("CACHE_REDIS_URL", ""))
+
+
+class SnapshotConfig(BaseModel):
+    """Raw sync snapshot archive configuration"""
+
+    # Leave empty to not archive syncs
+    directory: str = Field(default=os.environ.get("SNAPSHOT_DIR", ""))
+    keep: int = Field(default=int(os.environ.get("SNAPSHOT_KEEP", "5")), ge=1)
 
 
 class Settings(BaseModel):
@@ -25,6 +147,10 @@ class Settings(BaseModel):
 
     db: DatabaseConfig = Field(default_factory=DatabaseConfig)
     api: ApiConfig = Field(default_factory=ApiConfig)
+    sync: SyncConfig = Field(default_factory=SyncConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    snapshot: SnapshotConfig = Field(default_factory=SnapshotConfig)
     app_name: str = Field(default=os.environ.get("APP_NAME", "Silk Exercise"))
     environment: str = Field(default=os.environ.get("ENVIRONMENT", "development"))
 
@@ -1,12 +1,18 @@
 import logging
-from typing import Optional
+from typing import Any, Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
 from urllib.parse import quote_plus
 
+from core.cache import bump_generation
 from core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Server error code of an index that exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
@@ -28,6 +34,19 @@ class Database:
             return f"mongodb://{escaped_user}:{escaped_password}@{host}:{port}/{database}?authSource=admin"
         return f"mongodb://{host}:{port}/{database}"
 
+    @staticmethod
+    def get_client_options() -> Dict[str, Any]:
+        """Connection pool and timeout options from settings"""
+        options = {
+            "maxPoolSize": settings.db.max_pool_size,
+            "minPoolSize": settings.db.min_pool_size,
+            "serverSelectionTimeoutMS": settings.db.server_selection_timeout_ms,
+            "connectTimeoutMS": settings.db.connect_timeout_ms,
+        }
+        if settings.db.socket_timeout_ms:
+            options["socketTimeoutMS"] = settings.db.socket_timeout_ms
+        return options
+
     async def connect_to_database(self) -> None:
         if self.client is not None:
             return
@@ -37,7 +56,7 @@ class Database:
 
         logger.info(f"Connecting to MongoDB at {settings.db.host}:{settings.db.port}")
         try:
-            self.client = AsyncIOMotorClient(mongo_url)
+            self.client = AsyncIOMotorClient(mongo_url, **self.get_client_options())
             await self.client.admin.command("ping")
             self.db = self.client[db_name]
             logger.info("Connected to MongoDB successfully")
@@ -56,6 +75,139 @@ class Database:
         logger.info("Closed MongoDB connection")
 
 
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    """Create the indexes the sync and the API rely on. Safe to call repeatedly."""
+    try:
+        await db.integrated_hosts.create_indexes(
+            [
+                IndexModel(
+                    [("address", ASCENDING), ("dns_host_name", ASCENDING)],
+                    unique=True,
+                    name="host_match_key",
+                ),
+                IndexModel(
+                    [("os_tokens", ASCENDING), ("last_seen", ASCENDING)],
+                    name="os_tokens_last_seen",
+                ),
+                # Keyset pages of filtered listings: _id after the filter field
+                IndexModel(
+                    [("os_tokens", ASCENDING), ("_id", ASCENDING)],
+                    name="os_tokens_id",
+                ),
+                IndexModel(
+                    [("last_seen", ASCENDING), ("_id", ASCENDING)],
+                    name="last_seen_id",
+                ),
+            ]
+        )
+        await db.host_vulnerabilities.create_indexes(
+            [
+                IndexModel([("qid", ASCENDING), ("_id", ASCENDING)], name="qid"),
+                IndexModel([("host_id", ASCENDING)], name="host_id"),
+            ]
+        )
+        await db.host_software.create_indexes(
+            [
+                # Equality on the name, pages in _id order, version range last
+                IndexModel(
+                    [
+                        ("name_lower", ASCENDING),
+                        ("_id", ASCENDING),
+                        ("version_key", ASCENDING),
+                    ],
+                    name="name_version",
+                ),
+                IndexModel([("host_id", ASCENDING)], name="host_id"),
+            ]
+        )
+        await db.sync_staging.create_indexes(
+            [
+                IndexModel(
+                    [
+                        ("sync_id", ASCENDING),
+                        ("shard", ASCENDING),
+                        ("source", ASCENDING),
+                        ("seq", ASCENDING),
+                    ],
+                    name="shard_batches",
+                ),
+            ]
+        )
+        # Batches of syncs that never finished are dropped after the TTL
+        await ensure_ttl_index(
+            db.sync_staging, "created_at", "staging_ttl", settings.sync.staging_ttl
+        )
+    except Exception as e:
+        logger.error(f"Failed to create indexes: {str(e)}")
+        raise
+
+
+async def ensure_ttl_index(
+    collection, field: str, name: str, expire_after_seconds: int
+) -> None:
+    """Create a TTL index, or update its expiry if it exists with another one"""
+    try:
+        await collection.create_index(
+            [(field, ASCENDING)], name=name, expireAfterSeconds=expire_after_seconds
+        )
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await collection.database.command(
+            "collMod",
+            collection.name,
+            index={"name": name, "expireAfterSeconds": expire_after_seconds},
+        )
+        logger.info(
+            f"Changed expiry of index {collection.name}.{name} to {expire_after_seconds}s"
+        )
+
+
+async def backfill_derived_fields(db: AsyncIOMotorDatabase) -> None:
+    """Add the derived fields to hosts written before the sync computed them"""
+    result = await db.integrated_hosts.update_many(
+        {
+            "$or": [
+                {"os_tokens": {"$exists": False}},
+                {"vuln_count": {"$exists": False}},
+            ]
+        },
+        [
+            {
+                "$set": {
+                    "os_tokens": {
+                        "$cond": [
+                            {"$eq": [{"$type": "$os"}, "string"]},
+                            {
+                                "$map": {
+                                    "input": {
+                                        "$regexFindAll": {
+                                            "input": {"$toLower": "$os"},
+                                            "regex": "[a-z0-9]+",
+                                        }
+                                    },
+                                    "in": "$$this.match",
+                                }
+                            },
+                            [],
+                        ]
+                    },
+                    "vuln_count": {
+                        "$cond": [
+                            {"$isArray": "$vuln.list"},
+                            {"$size": "$vuln.list"},
+                            0,
+                        ]
+                    },
+                }
+            }
+        ],
+    )
+    if result.modified_count:
+        logger.info(f"Backfilled derived fields on {result.modified_count} hosts")
+        await bump_generation(db)
+
+
 db_instance = Database()
 
 
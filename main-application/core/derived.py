@@ -0,0 +1,31 @@
+import re
+from typing import Any, Dict, List
+
+_OS_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize_os(value: Any) -> List[str]:
+    """Split an OS name into lowercase alphanumeric tokens"""
+    if not isinstance(value, str):
+        return []
+    return _OS_TOKEN.findall(value.lower())
+
+
+def count_vulnerabilities(document: Dict[str, Any]) -> int:
+    vuln = document.get("vuln")
+    items = vuln.get("list") if isinstance(vuln, dict) else None
+    return len(items) if isinstance(items, list) else 0
+
+
+def add_derived_fields(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add the fields the API filters and lists on to a merged host document.
+
+    os_tokens holds the lowercase tokens of the OS name, so that OS filters
+    can be answered by an anchored prefix lookup on a multikey index instead
+    of an unanchored regex scan. vuln_count lets listings show the number of
+    vulnerabilities without loading vuln.list.
+    """
+    document["os_tokens"] = tokenize_os(document.get("os"))
+    document["vuln_count"] = count_vulnerabilities(document)
+    return document
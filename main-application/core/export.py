@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Sequence
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Columns of the CSV export, the same as the dashboard table
+CSV_COLUMNS = (
+    "Hostname",
+    "IP Address",
+    "Operating System",
+    "Last Seen",
+    "Vulnerabilities",
+)
+
+# Fields the CSV columns are built from
+CSV_FIELDS = (
+    "name",
+    "fqdn",
+    "dns_host_name",
+    "address",
+    "network_interface.list.host_asset_interface.address",
+    "os",
+    "last_seen",
+    "modified",
+    "agent_info.last_checked_in",
+    "vuln_count",
+)
+
+# Serialized bytes collected before a chunk is sent to the client
+CHUNK_SIZE = 64 * 1024
+
+
+def _first_interface_address(host: Dict) -> str:
+    interfaces = host.get("network_interface")
+    if not isinstance(interfaces, dict):
+        return ""
+    for interface in interfaces.get("list") or []:
+        address = (interface.get("host_asset_interface") or {}).get("address")
+        if address:
+            return address
+    return ""
+
+
+def _format_date(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value) if value else "N/A"
+
+
+def csv_row(host: Dict) -> List[Any]:
+    """One CSV row of a host, following transformHostForTable in the dashboard"""
+    agent_info = host.get("agent_info")
+    last_checked_in = (
+        agent_info.get("last_checked_in") if isinstance(agent_info, dict) else None
+    )
+    return [
+        host.get("name") or host.get("fqdn") or host.get("dns_host_name") or "N/A",
+        host.get("address") or _first_interface_address(host) or "N/A",
+        host.get("os") or "N/A",
+        _format_date(host.get("last_seen") or host.get("modified") or last_checked_in),
+        host.get("vuln_count") or 0,
+    ]
+
+
+def _csv_encoder() -> Callable[[Sequence[Any]], bytes]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def encode(row: Sequence[Any]) -> bytes:
+        out.seek(0)
+        out.truncate()
+        writer.writerow(row)
+        return out.getvalue().encode()
+
+    return encode
+
+
+def _ndjson_line(host: Dict) -> bytes:
+    try:
+        return orjson.dumps(host, default=str) + b"\n"
+    except TypeError:
+        # orjson rejects integers wider than 64 bits
+        return json.dumps(host, default=str).encode() + b"\n"
+
+
+async def export_chunks(
+    hosts: AsyncIterator[Dict], export_format: str, compress: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Serialize hosts from a cursor as CSV or NDJSON, optionally gzipped.
+
+    Hosts are encoded as they arrive and sent in chunks of about CHUNK_SIZE
+    bytes, so memory use does not depend on the size of the export.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = bytearray()
+    count = 0
+
+    if export_format == "csv":
+        encode_csv = _csv_encoder()
+        buffer += encode_csv(CSV_COLUMNS)
+
+        def encode(host: Dict) -> bytes:
+            return encode_csv(csv_row(host))
+
+    else:
+        encode = _ndjson_line
+
+    try:
+        async for host in hosts:
+            buffer += encode(host)
+            count += 1
+            if len(buffer) >= CHUNK_SIZE:
+                chunk = bytes(buffer)
+                buffer.clear()
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+    except Exception as e:
+        logger.error(f"Host export failed after {count} hosts: {str(e)}")
+        raise
+
+    chunk = bytes(buffer)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+    logger.info(f"Exported {count} hosts as {export_format}")
@@ -0,0 +1,149 @@
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import DeleteMany, InsertOne
+
+from .writer import host_key_filter
+
+logger = logging.getLogger(__name__)
+
+# Digits each numeric part of a version is padded to in version_key
+VERSION_PART_WIDTH = 12
+
+# sync_state entry recording that a full sync has filled the detail collections
+BACKFILL_STATE_ID = "host_details"
+
+_VERSION_PARTS = re.compile(r"\d+|[a-z]+")
+
+
+def version_key(version: Any) -> Optional[str]:
+    """
+    Sortable form of a version string, for range queries on host_software.
+
+    Numeric parts are zero-padded so they compare numerically ("1.10" after
+    "1.9"), text parts compare alphabetically and after numbers, and
+    separators are ignored. A version with neither gives None.
+    """
+    if version is None:
+        return None
+    parts = _VERSION_PARTS.findall(str(version).lower())
+    if not parts:
+        return None
+    return ".".join(
+        part.zfill(VERSION_PART_WIDTH) if part.isdigit() else part for part in parts
+    )
+
+
+def _entries(document: Dict, field: str, item: str) -> List[Dict]:
+    container = document.get(field)
+    if not isinstance(container, dict):
+        return []
+    entries = []
+    for entry in container.get("list") or []:
+        value = entry.get(item) if isinstance(entry, dict) else None
+        if isinstance(value, dict):
+            entries.append(value)
+    return entries
+
+
+def _host_link(host_id: Any, document: Dict) -> Dict[str, Any]:
+    return {"host_id": host_id, **host_key_filter(document)}
+
+
+def vulnerability_rows(host_id: Any, document: Dict) -> List[Dict]:
+    """One host_vulnerabilities row per vuln.list entry of a host document"""
+    link = _host_link(host_id, document)
+    return [
+        {**vuln, **link}
+        for vuln in _entries(document, "vuln", "host_asset_vuln")
+        if vuln.get("qid") is not None
+    ]
+
+
+def software_rows(host_id: Any, document: Dict) -> List[Dict]:
+    """One host_software row per software.list entry of a host document"""
+    link = _host_link(host_id, document)
+    rows = []
+    for software in _entries(document, "software", "host_asset_software"):
+        name = software.get("name")
+        if not isinstance(name, str) or not name.strip():
+            continue
+        rows.append(
+            {
+                **software,
+                **link,
+                "name_lower": name.strip().lower(),
+                "version_key": version_key(software.get("version")),
+            }
+        )
+    return rows
+
+
+class HostDetailWriter:
+    """
+    Keeps host_vulnerabilities and host_software in step with written hosts.
+
+    Called with every batch BulkHostWriter has written: the rows of each host
+    in the batch are replaced, and hosts the sync skipped as unchanged are
+    left alone. Rows link to their host by host_id, the _id of the host in
+    integrated_hosts, looked up once per batch through the host_match_key
+    index.
+    """
+
+    def __init__(self, db):
+        self.hosts = db.integrated_hosts
+        self.vulnerabilities = db.host_vulnerabilities
+        self.software = db.host_software
+        self.vulnerability_rows = 0
+        self.software_rows = 0
+
+    async def write(self, documents: List[Dict]) -> None:
+        keys = [host_key_filter(document) for document in documents]
+        host_ids = {}
+        async for host in self.hosts.find(
+            {"$or": keys}, {"address": 1, "dns_host_name": 1}
+        ):
+            host_ids[tuple(host_key_filter(host).values())] = host["_id"]
+
+        vulnerability_requests: List[Any] = []
+        software_requests: List[Any] = []
+        for key, document in zip(keys, documents):
+            host_id = host_ids.get(tuple(key.values()))
+            if host_id is None:
+                logger.warning(f"Written host {key} not found, skipping its details")
+                continue
+            vulnerabilities = vulnerability_rows(host_id, document)
+            software = software_rows(host_id, document)
+            vulnerability_requests.append(DeleteMany({"host_id": host_id}))
+            vulnerability_requests.extend(InsertOne(row) for row in vulnerabilities)
+            software_requests.append(DeleteMany({"host_id": host_id}))
+            software_requests.extend(InsertOne(row) for row in software)
+            self.vulnerability_rows += len(vulnerabilities)
+            self.software_rows += len(software)
+
+        # Ordered, so that a host's old rows are deleted before its new ones land
+        if vulnerability_requests:
+            await self.vulnerabilities.bulk_write(vulnerability_requests, ordered=True)
+        if software_requests:
+            await self.software.bulk_write(software_requests, ordered=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "vulnerability_rows": self.vulnerability_rows,
+            "software_rows": self.software_rows,
+        }
+
+
+async def details_backfilled(db) -> bool:
+    """Whether a full sync has filled the detail collections yet"""
+    return await db.sync_state.find_one({"_id": BACKFILL_STATE_ID}) is not None
+
+
+async def mark_details_backfilled(db) -> None:
+    await db.sync_state.update_one(
+        {"_id": BACKFILL_STATE_ID},
+        {"$set": {"backfilled_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import orjson
+from pymongo import UpdateOne
+
+from .matching import MatchKey
+from .scripts import standardize_date
+
+logger = logging.getLogger(__name__)
+
+# Version of the code turning source records into host documents (normalize,
+# merge, derived fields, matching). Bump it whenever that output changes:
+# fingerprints and watermarks saved under another version are ignored, so the
+# next sync reprocesses every host instead of skipping it as unchanged.
+PIPELINE_VERSION = 1
+
+# Record fields holding the upstream modification time, in order of preference
+WATERMARK_FIELDS = {
+    "crowdstrike": ("modified_timestamp", "last_seen"),
+    "qualys": ("modified",),
+}
+
+
+def fingerprint(document: Any) -> str:
+    """Stable content hash of a record, independent of key order"""
+    try:
+        payload = orjson.dumps(
+            document, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+    except TypeError:
+        # orjson rejects integers wider than 64 bits and unknown types
+        payload = json.dumps(document, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def record_timestamp(record: Dict, host_type: str) -> Optional[datetime]:
+    """Upstream modification time of a raw record, if it carries one"""
+    for field in WATERMARK_FIELDS.get(host_type, ()):
+        value = record.get(field)
+        if isinstance(value, dict) and len(value) == 1 and "$date" in value:
+            value = value["$date"]
+            if isinstance(value, (int, float)):
+                return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+        value = standardize_date(value)
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return value
+    return None
+
+
+def _fingerprint_id(key: MatchKey) -> Dict[str, str]:
+    return {"address": key[0], "dns_host_name": key[1]}
+
+
+class FingerprintStore:
+    """
+    Per-host content fingerprints of the last synced source records and merged
+    document, kept in the host_fingerprints collection under the raw match key.
+
+    Lookups are done a page at a time. New fingerprints are staged by the
+    writer stage and only saved after the batch holding their host has been
+    written, so a failed write is simply retried by the next sync. Entries
+    saved by another PIPELINE_VERSION are not returned by lookup, which makes
+    their hosts count as changed.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._staged: Dict[Tuple, Dict[str, Any]] = {}
+
+    async def lookup(self, keys: Iterable[MatchKey]) -> Dict[MatchKey, Dict[str, str]]:
+        ids = [_fingerprint_id(key) for key in set(keys)]
+        if not ids:
+            return {}
+        known = {}
+        async for entry in self.collection.find({"_id": {"$in": ids}}):
+            if entry.get("pipeline_version") != PIPELINE_VERSION:
+                continue
+            key = (entry["_id"]["address"], entry["_id"]["dns_host_name"])
+            known[key] = entry
+        return known
+
+    def stage(self, key: MatchKey, fingerprints: Dict[str, str]) -> None:
+        self._staged[key] = fingerprints
+
+    async def flush(self) -> None:
+        if not self._staged:
+            return
+        synced_at = datetime.now(timezone.utc)
+        requests = [
+            UpdateOne(
+                {"_id": _fingerprint_id(key)},
+                {
+                    "$set": {
+                        **fingerprints,
+                        "pipeline_version": PIPELINE_VERSION,
+                        "synced_at": synced_at,
+                    }
+                },
+                upsert=True,
+            )
+            for key, fingerprints in self._staged.items()
+        ]
+        self._staged = {}
+        await self.collection.bulk_write(requests, ordered=False)
+
+
+class WatermarkStore:
+    """
+    Newest upstream modification time seen per source, kept in sync_state.
+
+    Watermarks saved by another PIPELINE_VERSION are not loaded, so the first
+    sync after a pipeline change fetches every page again.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def load(self) -> Dict[str, datetime]:
+        watermarks = {}
+        async for entry in self.collection.find({"_id": {"$regex": "^watermark:"}}):
+            if entry.get("pipeline_version") != PIPELINE_VERSION:
+                continue
+            value = entry["value"]
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            watermarks[entry["_id"].split(":", 1)[1]] = value
+        return watermarks
+
+    async def save(self, watermarks: Dict[str, datetime]) -> None:
+        for host_type, value in watermarks.items():
+            # $max keeps the stored watermark from ever moving backwards
+            await self.collection.update_one(
+                {"_id": f"watermark:{host_type}"},
+                {
+                    "$max": {"value": value},
+                    "$set": {"pipeline_version": PIPELINE_VERSION},
+                },
+                upsert=True,
+            )
@@ -0,0 +1,339 @@
+import ipaddress
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .metrics import MATCH_KEYS
+
+logger = logging.getLogger(__name__)
+
+MatchKey = Tuple[str, str]
+# (qualys, crowdstrike, {"keys": [...], "score": n})
+Match = Tuple[Dict, Dict, Dict]
+
+# Score each kind of key adds when a candidate pair shares it; a MAC alone is
+# enough for the default threshold, a hostname or an IP alone is not
+MATCH_WEIGHTS = {"mac": 3, "hostname": 2, "ip": 1}
+
+# Hostnames too generic to tell hosts apart
+IGNORED_HOSTNAMES = {"localhost", "localhost.localdomain", "unknown"}
+IGNORED_MACS = {"000000000000", "ffffffffffff"}
+
+_NON_HEX = re.compile(r"[^0-9a-f]")
+_IPV4 = re.compile(r"(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})")
+_IP_LITERAL = re.compile(r"[\d.]+|.*:.*")
+
+
+def qualys_match_key(record: Dict) -> Optional[MatchKey]:
+    if "address" not in record or "dnsHostName" not in record:
+        return None
+    return record["address"], record["dnsHostName"]
+
+
+def crowdstrike_match_key(record: Dict) -> Optional[MatchKey]:
+    if "local_ip" not in record or "hostname" not in record:
+        return None
+    return record["local_ip"], record["hostname"]
+
+
+def normalize_hostname(value) -> Optional[str]:
+    """Short lowercase hostname, so that an FQDN and its short name compare equal"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower().rstrip(".")
+    if not value or value in IGNORED_HOSTNAMES or _IP_LITERAL.fullmatch(value):
+        return None
+    return value.split(".", 1)[0]
+
+
+def normalize_ip(value) -> Optional[str]:
+    """Canonical IP address, or None for addresses shared by unrelated hosts"""
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    # IPv4 without the cost of ipaddress, which dominates key extraction
+    ipv4 = _IPV4.fullmatch(value)
+    if ipv4:
+        octets = [int(octet) for octet in ipv4.groups()]
+        if max(octets) > 255 or octets[0] in (0, 127) or octets[:2] == [169, 254]:
+            return None
+        return ".".join(map(str, octets))
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.is_unspecified or address.is_loopback or address.is_link_local:
+        return None
+    return str(address)
+
+
+def normalize_mac(value) -> Optional[str]:
+    """MAC address as 12 lowercase hex digits, whatever the separators"""
+    if not isinstance(value, str):
+        return None
+    value = _NON_HEX.sub("", value.lower())
+    if len(value) != 12 or value in IGNORED_MACS:
+        return None
+    return value
+
+
+NORMALIZERS = {
+    "hostname": normalize_hostname,
+    "ip": normalize_ip,
+    "mac": normalize_mac,
+}
+
+
+def _add_key(keys: Dict[str, Set[str]], kind: str, value) -> None:
+    normalized = NORMALIZERS[kind](value)
+    if normalized is not None:
+        keys[kind].add(normalized)
+
+
+def crowdstrike_blocking_keys(record: Dict) -> Dict[str, Set[str]]:
+    keys: Dict[str, Set[str]] = defaultdict(set)
+    _add_key(keys, "hostname", record.get("hostname"))
+    for field in ("local_ip", "connection_ip"):
+        _add_key(keys, "ip", record.get(field))
+    for field in ("mac_address", "connection_mac_address"):
+        _add_key(keys, "mac", record.get(field))
+    return keys
+
+
+def qualys_blocking_keys(record: Dict) -> Dict[str, Set[str]]:
+    keys: Dict[str, Set[str]] = defaultdict(set)
+    for field in ("dnsHostName", "fqdn", "name"):
+        _add_key(keys, "hostname", record.get(field))
+    _add_key(keys, "ip", record.get("address"))
+
+    interfaces = record.get("networkInterface")
+    if isinstance(interfaces, dict):
+        for entry in interfaces.get("list") or []:
+            interface = (
+                entry.get("hostAssetInterface") if isinstance(entry, dict) else None
+            )
+            if not isinstance(interface, dict):
+                continue
+            _add_key(keys, "hostname", interface.get("hostname"))
+            _add_key(keys, "ip", interface.get("address"))
+            _add_key(keys, "mac", interface.get("macAddress"))
+    return keys
+
+
+def _record_match(match: Dict) -> None:
+    for kind in match["keys"]:
+        MATCH_KEYS.labels(key=kind).inc()
+
+
+class CrowdstrikeIndex:
+    """
+    Hash index of CrowdStrike records keyed on (local_ip, hostname).
+
+    Duplicate keys keep the first record seen, which is the record the old
+    nested loop would have matched, and later duplicates are counted and
+    reported once when the index is built.
+    """
+
+    def __init__(self):
+        self._records: Dict[MatchKey, Dict] = {}
+        self.skipped = 0
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: Dict) -> None:
+        key = crowdstrike_match_key(record)
+        if key is None:
+            self.skipped += 1
+            logger.warning(
+                f"Skipping Crowdstrike record without local_ip or hostname: {record.get('device_id', 'unknown')}"
+            )
+            return
+
+        if key in self._records:
+            self.duplicates += 1
+            logger.warning(
+                f"Duplicate Crowdstrike match key {key}: keeping device {self._records[key].get('device_id')}, "
+                f"ignoring device {record.get('device_id')}"
+            )
+            return
+
+        self._records[key] = record
+
+    def extend(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.add(record)
+
+    def get(self, key: MatchKey) -> Optional[Dict]:
+        return self._records.get(key)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self)} Crowdstrike hosts "
+            f"({self.skipped} without match keys, {self.duplicates} duplicates)"
+        )
+
+    def probe(self, qualys_data: Iterable[Dict]) -> Iterator[Match]:
+        """
+        Yield (qualys, crowdstrike, match) for the Qualys records found in the index.
+
+        Every Qualys record is matched on its own, so Qualys records sharing a
+        key all pair with the same host.
+        """
+        for qualys in qualys_data:
+            key = qualys_match_key(qualys)
+            if key is None:
+                logger.warning(
+                    f"Skipping Qualys record without address or dnsHostName: {qualys.get('_id', 'unknown')}"
+                )
+                continue
+
+            crowdstrike = self._records.get(key)
+            if crowdstrike is not None:
+                match = {
+                    "keys": ["hostname", "ip"],
+                    "score": MATCH_WEIGHTS["hostname"] + MATCH_WEIGHTS["ip"],
+                }
+                _record_match(match)
+                yield qualys, crowdstrike, match
+
+
+class BlockingIndex:
+    """
+    Multi-key index of CrowdStrike records for scored matching.
+
+    Every record is filed in one block per normalized hostname, IP and MAC it
+    carries. A Qualys record is scored only against the records sharing one of
+    its blocks: each kind of key shared adds its MATCH_WEIGHTS weight once, and
+    the best candidate at or above threshold is the match, the first indexed
+    one on ties. Blocks holding more than max_block_size records (NAT
+    addresses, cloned images, generic hostnames) say nothing about identity
+    and are not scored, which also keeps probing linear in the fleet size.
+
+    Qualys records still need an address and dnsHostName, the key the merged
+    document is stored under.
+    """
+
+    def __init__(self, threshold: int = 3, max_block_size: int = 50):
+        self.threshold = threshold
+        self.max_block_size = max_block_size
+        self._records: List[Dict] = []
+        self._blocks: Dict[str, Dict[str, List[int]]] = {
+            kind: {} for kind in MATCH_WEIGHTS
+        }
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: Dict) -> None:
+        keys = crowdstrike_blocking_keys(record)
+        if not keys:
+            self.skipped += 1
+            logger.warning(
+                f"Skipping Crowdstrike record without hostname, IP or MAC: {record.get('device_id', 'unknown')}"
+            )
+            return
+
+        position = len(self._records)
+        self._records.append(record)
+        for kind, values in keys.items():
+            blocks = self._blocks[kind]
+            for value in values:
+                block = blocks.setdefault(value, [])
+                # One entry past the limit is enough to mark a block oversized
+                if len(block) <= self.max_block_size:
+                    block.append(position)
+
+    def extend(self, records: Iterable[Dict]) -> None:
+        for record in records:
+            self.add(record)
+
+    def oversized_blocks(self) -> int:
+        return sum(
+            len(block) > self.max_block_size
+            for blocks in self._blocks.values()
+            for block in blocks.values()
+        )
+
+    def summary(self) -> str:
+        return (
+            f"{len(self)} Crowdstrike hosts "
+            f"({self.skipped} without match keys, "
+            f"{self.oversized_blocks()} oversized blocks)"
+        )
+
+    def best_match(self, qualys: Dict) -> Optional[Tuple[Dict, Dict]]:
+        """The best scoring CrowdStrike record for a Qualys record and its match"""
+        scores: Dict[int, int] = defaultdict(int)
+        matched: Dict[int, List[str]] = defaultdict(list)
+        for kind, values in qualys_blocking_keys(qualys).items():
+            weight = MATCH_WEIGHTS[kind]
+            candidates: Set[int] = set()
+            for value in values:
+                block = self._blocks[kind].get(value)
+                if block and len(block) <= self.max_block_size:
+                    candidates.update(block)
+            for position in candidates:
+                scores[position] += weight
+                matched[position].append(kind)
+
+        best = None
+        for position, score in scores.items():
+            if score < self.threshold:
+                continue
+            if best is None or (score, -position) > (scores[best], -best):
+                best = position
+        if best is None:
+            return None
+        return self._records[best], {"keys": matched[best], "score": scores[best]}
+
+    def probe(self, qualys_data: Iterable[Dict]) -> Iterator[Match]:
+        """Yield (qualys, crowdstrike, match) for the Qualys records that match"""
+        for qualys in qualys_data:
+            if qualys_match_key(qualys) is None:
+                logger.warning(
+                    f"Skipping Qualys record without address or dnsHostName: {qualys.get('_id', 'unknown')}"
+                )
+                continue
+
+            found = self.best_match(qualys)
+            if found is not None:
+                crowdstrike, match = found
+                _record_match(match)
+                yield qualys, crowdstrike, match
+
+
+HostIndex = Union[CrowdstrikeIndex, BlockingIndex]
+
+
+def make_index(
+    mode: str = "exact", threshold: int = 3, max_block_size: int = 50
+) -> HostIndex:
+    """The CrowdStrike index of a match mode, exact or scored"""
+    if mode == "exact":
+        return CrowdstrikeIndex()
+    if mode == "scored":
+        return BlockingIndex(threshold=threshold, max_block_size=max_block_size)
+    raise ValueError(f"Unknown match mode: {mode}")
+
+
+def match_hosts(
+    crowdstrike_data: List[Dict],
+    qualys_data: Iterable[Dict],
+    mode: str = "exact",
+    **options,
+) -> Iterator[Match]:
+    """
+    Yield (qualys, crowdstrike, match) for every matched Qualys record.
+
+    The CrowdStrike side is indexed once and Qualys records are probed in a
+    single pass, in their original order. In "exact" mode a pair shares the
+    same address and hostname; in "scored" mode see BlockingIndex.
+    """
+    index = make_index(mode, **options)
+    index.extend(crowdstrike_data)
+    logger.info(f"Indexed {index.summary()}")
+    yield from index.probe(qualys_data)
@@ -0,0 +1,129 @@
+import logging
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Set in processes that fork (the Celery prefork pool): every child then writes
+# its samples to files in this directory and the exposition merges them.
+# Empty the directory before the parent process starts.
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+FETCH_PAGE_SECONDS = Histogram(
+    "silk_fetch_page_seconds", "Latency of one upstream page request", ["source"]
+)
+API_RETRIES = Counter(
+    "silk_api_retries",
+    "Upstream page requests retried after a transient failure",
+    ["source", "reason"],
+)
+API_CONCURRENCY_LIMIT = Gauge(
+    "silk_api_concurrency_limit",
+    "Adaptive limit on in-flight upstream requests",
+    ["source"],
+    multiprocess_mode="liveall",
+)
+RECORDS_FETCHED = Counter(
+    "silk_records_fetched", "Host records fetched from upstream", ["source"]
+)
+RECORDS_NORMALIZED = Counter(
+    "silk_records_normalized", "Host records normalized", ["source"]
+)
+NORMALIZE_SECONDS = Counter(
+    "silk_normalize_seconds", "Time spent normalizing host records", ["source"]
+)
+MATCH_PROBES = Counter(
+    "silk_match_probes", "Qualys records probed against the CrowdStrike index"
+)
+MATCH_HITS = Counter("silk_match_hits", "Qualys records matched to a CrowdStrike host")
+MATCH_KEYS = Counter(
+    "silk_match_keys", "Matched host pairs by kind of key shared", ["key"]
+)
+MERGE_SECONDS = Histogram(
+    "silk_merge_seconds",
+    "Time to merge one normalized host pair",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+DB_WRITE_SECONDS = Histogram(
+    "silk_db_write_seconds", "Latency of one bulk write to integrated_hosts"
+)
+DOCUMENTS_WRITTEN = Counter(
+    "silk_documents_written", "Merged host documents written", ["outcome"]
+)
+HOSTS_SKIPPED = Counter("silk_hosts_skipped", "Matched hosts skipped as unchanged")
+SYNC_SECONDS = Histogram(
+    "silk_sync_seconds",
+    "Duration of a whole sync",
+    ["status"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "silk_http_request_seconds",
+    "Latency of API requests",
+    ["method", "route", "status"],
+)
+
+
+CACHE_REQUESTS = Counter(
+    "silk_cache_requests",
+    "Response cache lookups of the API",
+    ["layer", "result"],
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get(MULTIPROC_DIR_ENV))
+
+
+def collector_registry() -> CollectorRegistry:
+    """
+    Registry to expose: the merged samples of every process writing to the
+    multiprocess directory, or this process's own metrics without one.
+    """
+    if not multiprocess_enabled():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render() -> bytes:
+    """Metrics in the Prometheus text exposition format"""
+    return generate_latest(collector_registry())
+
+
+def mark_process_dead(pid: int) -> None:
+    """Drop the live gauges of an exited process from the multiprocess directory"""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
+
+
+def start_worker_metrics_server(port: int) -> bool:
+    """Serve the metrics of all worker processes on /metrics from a daemon thread"""
+    if not multiprocess_enabled():
+        logger.warning(
+            f"{MULTIPROC_DIR_ENV} is not set, worker metrics on port {port} "
+            f"will not include the pool processes running the tasks"
+        )
+    try:
+        start_http_server(port, registry=collector_registry())
+    except OSError as e:
+        logger.error(f"Could not start worker metrics server on port {port}: {str(e)}")
+        return False
+    logger.info(f"Serving worker metrics on port {port}")
+    return True
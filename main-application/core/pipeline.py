@@ -0,0 +1,507 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import billiard
+
+from .api_client import SilkApiClient
+from .derived import add_derived_fields
+from .host_details import HostDetailWriter
+from .incremental import (
+    FingerprintStore,
+    WatermarkStore,
+    fingerprint,
+    record_timestamp,
+)
+from .matching import make_index, qualys_match_key
+from .metrics import (
+    HOSTS_SKIPPED,
+    MATCH_HITS,
+    MATCH_PROBES,
+    MERGE_SECONDS,
+    NORMALIZE_SECONDS,
+    RECORDS_NORMALIZED,
+)
+from .scripts import merge_normalized, normalize_sources
+from .writer import BulkHostWriter
+
+logger = logging.getLogger(__name__)
+
+HostPages = AsyncIterator[List[Dict]]
+HostSource = Union[List[Dict], HostPages]
+
+# Marks the end of a stage's output on its queue
+_DONE = object()
+
+# Matched hosts between two progress lines in the sync log
+PROGRESS_LOG_EVERY = 1000
+
+
+async def pages_in_thread(pages: Iterator[List[Dict]]) -> HostPages:
+    """
+    Iterate a blocking page generator in worker threads, closing it at the end.
+
+    A page being read keeps running in its thread when the consumer is
+    cancelled, and a generator cannot be closed while it runs, so the
+    in-flight read is shielded and waited for before the generator is closed.
+    """
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(asyncio.to_thread(next, pages, None))
+            page = await asyncio.shield(pending)
+            pending = None
+            if page is None:
+                return
+            yield page
+    finally:
+        if pending is not None:
+            await asyncio.wait({pending})
+            if not pending.cancelled():
+                # Retrieve the error of the abandoned read so it is not reported
+                pending.exception()
+        await asyncio.to_thread(pages.close)
+
+
+def fetch_pages(client: SilkApiClient, host_type: str, max_records: int) -> HostPages:
+    """Stream pages of one source from the API without blocking the event loop"""
+    return pages_in_thread(client.iter_host_pages(host_type, max_records))
+
+
+async def list_pages(records: List[Dict], page_size: int) -> HostPages:
+    for start in range(0, len(records), page_size):
+        yield records[start : start + page_size]
+
+
+def as_pages(source: HostSource, page_size: int) -> HostPages:
+    if isinstance(source, list):
+        return list_pages(source, page_size)
+    return source
+
+
+def build_document(
+    processed_qualys: Dict, processed_crowdstrike: Dict, match: Dict
+) -> Dict:
+    """The host document of a normalized matched pair"""
+    merged = merge_normalized(processed_qualys, processed_crowdstrike)
+    add_derived_fields(merged)
+    merged["match_keys"] = match["keys"]
+    merged["match_score"] = match["score"]
+    return merged
+
+
+def merge_chunk(
+    matches: List[Tuple[Dict, Dict, Dict]],
+) -> Tuple[List[Dict], Dict[str, float], List[float]]:
+    """
+    Normalize and merge a chunk of (qualys, crowdstrike, match) in a pool process.
+
+    Metrics of a pool process never reach the worker's registry, so the
+    normalize and merge timings are returned with the documents.
+    """
+    normalize_seconds = {}
+    normalized = {}
+    for position, host_type in enumerate(("qualys", "crowdstrike")):
+        start = time.perf_counter()
+        normalized[host_type] = normalize_sources(
+            [match[position] for match in matches], host_type
+        )
+        normalize_seconds[host_type] = time.perf_counter() - start
+
+    documents = []
+    merge_seconds = []
+    for processed_qualys, processed_crowdstrike, (_, _, match) in zip(
+        normalized["qualys"], normalized["crowdstrike"], matches
+    ):
+        start = time.perf_counter()
+        documents.append(build_document(processed_qualys, processed_crowdstrike, match))
+        merge_seconds.append(time.perf_counter() - start)
+    return documents, normalize_seconds, merge_seconds
+
+
+def start_merge_pool(processes: int):
+    """
+    A pool of processes for merge_chunk, or None if it cannot be started.
+
+    billiard, Celery's fork of multiprocessing, is used because prefork
+    worker processes are daemonic and multiprocessing refuses to start
+    children from them. The pool spawns fresh interpreters rather than
+    forking the worker with its event loop and MongoDB client threads.
+    """
+    try:
+        return billiard.get_context("spawn").Pool(processes)
+    except (OSError, AssertionError) as e:
+        logger.warning(f"Cannot start merge pool, merging in process: {str(e)}")
+        return None
+
+
+def _submit(pool, func, *args) -> asyncio.Future:
+    """Run func in the pool, as a future resolved on the running loop"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result: Any) -> None:
+        if not future.done():
+            future.set_result(result)
+
+    def fail(einfo) -> None:
+        # billiard reports errors, a lost worker included, as an ExceptionInfo
+        if not future.done():
+            future.set_exception(getattr(einfo, "exception", einfo))
+
+    pool.apply_async(
+        func,
+        args,
+        callback=lambda result: loop.call_soon_threadsafe(resolve, result),
+        error_callback=lambda einfo: loop.call_soon_threadsafe(fail, einfo),
+    )
+    return future
+
+
+class SyncPipeline:
+    """
+    Streaming sync: page fetch -> match -> normalize -> merge -> batched write.
+
+    Stages run as coroutines connected by bounded queues, so at any time only a
+    few Qualys pages and pages of matched pairs, queue_size items per
+    downstream queue, and one write batch are held in memory. The matched
+    pairs of a page are normalized together, one batch per source (see
+    SchemaNormalizer.normalize_batch). Normalized pairs are merged as they
+    arrive and without copying, since each normalized tree belongs to a single
+    pair.
+
+    The CrowdStrike side is the build side of the hash join and is indexed in
+    full before Qualys pages are probed; Qualys fetching is held back by its
+    queue until the index is ready. The queue sizes do not bound the index: it
+    keeps every CrowdStrike record passed in, so memory grows with the fleet
+    unless the sync is sharded (see tasks.process_host_shard). match_mode picks the index: "exact" pairs
+    hosts on (address, hostname), "scored" on weighted hostname, IP and MAC
+    blocks (see matching.BlockingIndex). Merged documents record the keys
+    their pair matched on.
+
+    With merge_processes set, normalize and merge run in a process pool
+    instead of the event loop: matched pairs are sent in chunks of
+    merge_chunk_size, at most two chunks per process are in flight, and
+    documents reach the writer in match order, the same as merged in process.
+
+    With host_details set, the vulnerabilities and software of every written
+    host are also stored as rows of host_vulnerabilities and host_software.
+
+    With incremental set, matched pairs whose source fingerprints are unchanged
+    since the last sync are dropped right after matching, and merged documents
+    identical to the last written one are not rewritten. force_full disables
+    both shortcuts. With stop_at_watermark set, fetching of a source stops at
+    the first page holding nothing newer than that source's watermark; this
+    assumes the upstream returns newest records first, so a forced full
+    resync should still be scheduled to pick up pairs it would miss.
+    """
+
+    def __init__(
+        self,
+        db,
+        write_batch_size: int = 500,
+        page_queue_size: int = 2,
+        queue_size: int = 100,
+        incremental: bool = True,
+        force_full: bool = False,
+        stop_at_watermark: bool = False,
+        match_mode: str = "exact",
+        match_threshold: int = 3,
+        match_max_block_size: int = 50,
+        merge_processes: int = 0,
+        merge_chunk_size: int = 64,
+        host_details: bool = True,
+    ):
+        self.db = db
+        self.write_batch_size = write_batch_size
+        self.page_queue_size = page_queue_size
+        self.queue_size = queue_size
+        self.incremental = incremental
+        self.force_full = force_full
+        self.stop_at_watermark = stop_at_watermark and not force_full
+        self.index = make_index(
+            match_mode, threshold=match_threshold, max_block_size=match_max_block_size
+        )
+        self.merge_processes = merge_processes
+        self.merge_chunk_size = merge_chunk_size
+        self.details = HostDetailWriter(db) if host_details else None
+        self.fingerprints = FingerprintStore(db.host_fingerprints)
+        self.watermark_store = WatermarkStore(db.sync_state)
+        self.watermarks: Dict[str, datetime] = {}
+        self.newest: Dict[str, datetime] = {}
+        self.crowdstrike_count = 0
+        self.qualys_count = 0
+        self.processed_count = 0
+        self.skipped_count = 0
+
+    async def run(
+        self, crowdstrike_pages: HostPages, qualys_pages: HostPages
+    ) -> Dict[str, Any]:
+        if self.stop_at_watermark:
+            self.watermarks = await self.watermark_store.load()
+
+        page_queue: asyncio.Queue = asyncio.Queue(maxsize=self.page_queue_size)
+        # Matched pairs travel a page at a time, to be normalized together
+        pair_queue: asyncio.Queue = asyncio.Queue(maxsize=self.page_queue_size)
+        normalized_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        document_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        index_ready = asyncio.Event()
+        writer = BulkHostWriter(
+            self.db.integrated_hosts,
+            batch_size=self.write_batch_size,
+            on_flush=self.fingerprints.flush if self.incremental else None,
+            on_write=self.details.write if self.details is not None else None,
+        )
+
+        pool = start_merge_pool(self.merge_processes) if self.merge_processes else None
+        if pool is not None:
+            merge_stages = [self._merge_in_pool(pair_queue, document_queue, pool)]
+        else:
+            merge_stages = [
+                self._normalize(pair_queue, normalized_queue),
+                self._merge(normalized_queue, document_queue),
+            ]
+
+        stages = [
+            asyncio.create_task(self._build_index(crowdstrike_pages, index_ready)),
+            asyncio.create_task(self._fetch_qualys(qualys_pages, page_queue)),
+            asyncio.create_task(self._match(page_queue, pair_queue, index_ready)),
+            *(asyncio.create_task(stage) for stage in merge_stages),
+            asyncio.create_task(self._write(document_queue, writer)),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        finally:
+            if pool is not None:
+                # Every chunk has been collected unless the sync failed
+                pool.terminate()
+                await asyncio.to_thread(pool.join)
+
+        await self.watermark_store.save(self.newest)
+
+        logger.info(
+            f"Processed {self.processed_count} matched records from "
+            f"{self.crowdstrike_count} Crowdstrike and {self.qualys_count} Qualys records, "
+            f"skipped {self.skipped_count} unchanged"
+        )
+        return {
+            "processed_count": self.processed_count,
+            "skipped_count": self.skipped_count,
+            **writer.stats(),
+            **(self.details.stats() if self.details is not None else {}),
+        }
+
+    def _track_watermark(self, host_type: str, page: List[Dict]) -> bool:
+        """Record the newest timestamp of a page; True if fetching should stop"""
+        timestamps = [
+            timestamp
+            for timestamp in (record_timestamp(record, host_type) for record in page)
+            if timestamp is not None
+        ]
+        if not timestamps:
+            return False
+
+        page_newest = max(timestamps)
+        if host_type not in self.newest or page_newest > self.newest[host_type]:
+            self.newest[host_type] = page_newest
+
+        watermark = self.watermarks.get(host_type)
+        if self.stop_at_watermark and watermark and page_newest <= watermark:
+            logger.info(
+                f"Reached {host_type} watermark {watermark.isoformat()}, stopping fetch"
+            )
+            return True
+        return False
+
+    async def _build_index(self, pages: HostPages, index_ready: asyncio.Event) -> None:
+        async with aclosing(pages):
+            async for page in pages:
+                self.crowdstrike_count += len(page)
+                self.index.extend(page)
+                if self._track_watermark("crowdstrike", page):
+                    break
+        logger.info(f"Indexed {self.index.summary()}")
+        index_ready.set()
+
+    async def _fetch_qualys(self, pages: HostPages, page_queue: asyncio.Queue) -> None:
+        async with aclosing(pages):
+            async for page in pages:
+                self.qualys_count += len(page)
+                await page_queue.put(page)
+                if self._track_watermark("qualys", page):
+                    break
+        await page_queue.put(_DONE)
+
+    async def _match(
+        self,
+        page_queue: asyncio.Queue,
+        pair_queue: asyncio.Queue,
+        index_ready: asyncio.Event,
+    ) -> None:
+        await index_ready.wait()
+        while (page := await page_queue.get()) is not _DONE:
+            matches = list(self.index.probe(page))
+            MATCH_PROBES.inc(len(page))
+            MATCH_HITS.inc(len(matches))
+            if self.incremental:
+                matches = await self._changed_pairs(matches)
+            else:
+                matches = [match + (None,) for match in matches]
+            for qualys, crowdstrike, match, _ in matches:
+                logger.debug(
+                    "Match found - Qualys ID: %s, Crowdstrike ID: %s, keys: %s",
+                    qualys.get("id"),
+                    crowdstrike.get("device_id"),
+                    match["keys"],
+                )
+            if matches:
+                await pair_queue.put(matches)
+        await pair_queue.put(_DONE)
+
+    async def _changed_pairs(self, matches: List[Tuple]) -> List[Tuple]:
+        """Fingerprint a page of matched pairs and drop the ones already synced"""
+        keys = [qualys_match_key(qualys) for qualys, _, _ in matches]
+        known = await self.fingerprints.lookup(keys)
+
+        changed = []
+        for key, (qualys, crowdstrike, match) in zip(keys, matches):
+            state = {
+                "key": key,
+                "fingerprints": {
+                    "qualys": fingerprint(qualys),
+                    "crowdstrike": fingerprint(crowdstrike),
+                },
+                "merged": None,
+            }
+            previous = known.get(key)
+            if previous is not None and not self.force_full:
+                if (
+                    previous.get("qualys") == state["fingerprints"]["qualys"]
+                    and previous.get("crowdstrike")
+                    == state["fingerprints"]["crowdstrike"]
+                ):
+                    self.skipped_count += 1
+                    HOSTS_SKIPPED.inc()
+                    continue
+                state["merged"] = previous.get("merged")
+            changed.append((qualys, crowdstrike, match, state))
+        return changed
+
+    async def _normalize(
+        self, pair_queue: asyncio.Queue, normalized_queue: asyncio.Queue
+    ) -> None:
+        while (pairs := await pair_queue.get()) is not _DONE:
+            processed_qualys = self._timed_normalize(
+                [pair[0] for pair in pairs], "qualys"
+            )
+            processed_crowdstrike = self._timed_normalize(
+                [pair[1] for pair in pairs], "crowdstrike"
+            )
+            for normalized_qualys, normalized_crowdstrike, (_, _, match, state) in zip(
+                processed_qualys, processed_crowdstrike, pairs
+            ):
+                await normalized_queue.put(
+                    (normalized_qualys, normalized_crowdstrike, match, state)
+                )
+        await normalized_queue.put(_DONE)
+
+    @staticmethod
+    def _timed_normalize(records: List[Dict], host_type: str) -> List[Dict]:
+        start = time.perf_counter()
+        normalized = normalize_sources(records, host_type)
+        NORMALIZE_SECONDS.labels(source=host_type).inc(time.perf_counter() - start)
+        RECORDS_NORMALIZED.labels(source=host_type).inc(len(records))
+        return normalized
+
+    async def _merge(
+        self, normalized_queue: asyncio.Queue, document_queue: asyncio.Queue
+    ) -> None:
+        while (pair := await normalized_queue.get()) is not _DONE:
+            processed_qualys, processed_crowdstrike, match, state = pair
+            with MERGE_SECONDS.time():
+                merged = build_document(processed_qualys, processed_crowdstrike, match)
+            await document_queue.put((merged, state))
+        await document_queue.put(_DONE)
+
+    async def _merge_in_pool(
+        self, pair_queue: asyncio.Queue, document_queue: asyncio.Queue, pool
+    ) -> None:
+        in_flight: Deque[Tuple[asyncio.Future, List[Optional[Dict]]]] = deque()
+        chunk: List[Tuple] = []
+
+        def submit() -> None:
+            matches = [
+                (qualys, crowdstrike, match) for qualys, crowdstrike, match, _ in chunk
+            ]
+            states = [state for _, _, _, state in chunk]
+            in_flight.append((_submit(pool, merge_chunk, matches), states))
+            chunk.clear()
+
+        async def collect() -> None:
+            future, states = in_flight.popleft()
+            documents, normalize_seconds, merge_seconds = await future
+            for host_type, seconds in normalize_seconds.items():
+                NORMALIZE_SECONDS.labels(source=host_type).inc(seconds)
+                RECORDS_NORMALIZED.labels(source=host_type).inc(len(documents))
+            for seconds in merge_seconds:
+                MERGE_SECONDS.observe(seconds)
+            for document, state in zip(documents, states):
+                await document_queue.put((document, state))
+
+        while (pairs := await pair_queue.get()) is not _DONE:
+            for pair in pairs:
+                chunk.append(pair)
+                if len(chunk) >= self.merge_chunk_size:
+                    if len(in_flight) >= 2 * self.merge_processes:
+                        await collect()
+                    submit()
+            # Pass on finished chunks without waiting for the next one to fill
+            while in_flight and in_flight[0][0].done():
+                await collect()
+        if chunk:
+            submit()
+        while in_flight:
+            await collect()
+        await document_queue.put(_DONE)
+
+    async def _write(
+        self, document_queue: asyncio.Queue, writer: BulkHostWriter
+    ) -> None:
+        while (item := await document_queue.get()) is not _DONE:
+            document, state = item
+            self.processed_count += 1
+            if self.processed_count % PROGRESS_LOG_EVERY == 0:
+                logger.info(
+                    f"Sync progress: {self.processed_count} hosts merged, "
+                    f"{self.skipped_count} skipped as unchanged"
+                )
+            if state is not None:
+                merged = fingerprint(document)
+                self.fingerprints.stage(
+                    state["key"], {**state["fingerprints"], "merged": merged}
+                )
+                if merged == state["merged"]:
+                    self.skipped_count += 1
+                    HOSTS_SKIPPED.inc()
+                    continue
+            await writer.add(document)
+        await writer.flush()
@@ -0,0 +1,197 @@
+"""
+Replay a raw sync snapshot through the merge pipeline, offline.
+
+Reruns process_data on the archived upstream pages of a snapshot into a
+scratch database, with no API calls, and diffs the result against the live
+integrated_hosts collection, so normalization and merge changes can be
+checked before a real sync.
+
+    python -m core.replay                    # latest snapshot in SNAPSHOT_DIR
+    python -m core.replay snapshots/20250101T000000-1a2b3c4d --output diff.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from .config import settings
+from .database import Database, ensure_indexes
+from .incremental import fingerprint
+from .snapshots import list_snapshots, read_manifest, read_pages
+from .tasks import process_data
+from .writer import host_key_filter
+
+logger = logging.getLogger(__name__)
+
+# Scratch collections process_data writes to
+SCRATCH_COLLECTIONS = (
+    "integrated_hosts",
+    "host_fingerprints",
+    "host_vulnerabilities",
+    "host_software",
+    "sync_state",
+)
+
+
+def _host_key(document: Dict) -> Tuple:
+    return tuple(host_key_filter(document).values())
+
+
+def _content(document: Dict) -> Dict:
+    return {name: value for name, value in document.items() if name != "_id"}
+
+
+async def replay_snapshot(db, snapshot_dir: str) -> Dict[str, Any]:
+    """Rebuild integrated_hosts of db from a snapshot, resetting what was there"""
+    for name in SCRATCH_COLLECTIONS:
+        await db.drop_collection(name)
+    await ensure_indexes(db)
+
+    start = time.perf_counter()
+    counts = await process_data(
+        db,
+        read_pages(snapshot_dir, "crowdstrike", settings.api.page_size),
+        read_pages(snapshot_dir, "qualys", settings.api.page_size),
+        force_full=True,
+        stop_at_watermark=False,
+    )
+    return {**counts, "duration_seconds": round(time.perf_counter() - start, 3)}
+
+
+async def diff_hosts(live, replayed, max_examples: int = 20) -> Dict[str, Any]:
+    """
+    Compare two integrated_hosts collections host by host.
+
+    Hosts are paired on their (address, dns_host_name) key and compared
+    without _id. Only a fingerprint per live host is held in memory; the live
+    document is read again only for hosts that differ, to name the changed
+    top-level fields.
+    """
+    live_prints: Dict[Tuple, str] = {}
+    async for document in live.find({}):
+        live_prints[_host_key(document)] = fingerprint(_content(document))
+
+    changed_fields: Counter = Counter()
+    examples: List[Dict[str, Any]] = []
+    replayed_count = unchanged = changed = only_replayed = 0
+    async for document in replayed.find({}):
+        replayed_count += 1
+        key = _host_key(document)
+        live_print = live_prints.pop(key, None)
+        if live_print is None:
+            only_replayed += 1
+            continue
+        content = _content(document)
+        if fingerprint(content) == live_print:
+            unchanged += 1
+            continue
+
+        changed += 1
+        live_content = _content(await live.find_one(host_key_filter(document)) or {})
+        fields = sorted(
+            name
+            for name in set(content) | set(live_content)
+            if fingerprint(content.get(name)) != fingerprint(live_content.get(name))
+        )
+        changed_fields.update(fields)
+        if len(examples) < max_examples:
+            examples.append({"host": list(key), "fields": fields})
+
+    return {
+        "replayed": replayed_count,
+        "unchanged": unchanged,
+        "changed": changed,
+        "only_replayed": only_replayed,
+        "only_live": len(live_prints),
+        "changed_fields": dict(changed_fields.most_common()),
+        "examples": examples,
+    }
+
+
+def resolve_snapshot(path: Optional[str]) -> str:
+    if path:
+        return path
+    snapshots = list_snapshots(settings.snapshot.directory)
+    if not snapshots:
+        raise SystemExit(
+            f"No snapshots in SNAPSHOT_DIR={settings.snapshot.directory!r}, "
+            "pass a snapshot directory"
+        )
+    return snapshots[-1]
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    snapshot_dir = resolve_snapshot(args.snapshot)
+    manifest = read_manifest(snapshot_dir)
+    if manifest is None:
+        logger.warning(f"Snapshot {snapshot_dir} has no manifest, it may be partial")
+
+    client = AsyncIOMotorClient(
+        Database.get_mongo_url(), **Database.get_client_options()
+    )
+    try:
+        scratch = client[args.database]
+        report: Dict[str, Any] = {"snapshot": snapshot_dir, "manifest": manifest}
+        report["replay"] = await replay_snapshot(scratch, snapshot_dir)
+        if args.diff:
+            report["diff"] = await diff_hosts(
+                client[settings.db.database].integrated_hosts,
+                scratch.integrated_hosts,
+                max_examples=args.examples,
+            )
+        if not args.keep:
+            await client.drop_database(args.database)
+        return report
+    finally:
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "snapshot", nargs="?", help="Snapshot directory (default: the latest)"
+    )
+    parser.add_argument(
+        "--database",
+        default=f"{settings.db.database}_replay",
+        help="Scratch database to replay into",
+    )
+    parser.add_argument(
+        "--no-diff",
+        dest="diff",
+        action="store_false",
+        help="Skip the diff against the live integrated_hosts",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the scratch database afterwards"
+    )
+    parser.add_argument("--examples", type=int, default=20)
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    if args.database == settings.db.database:
+        parser.error("--database must not be the live database")
+
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    else:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Hosts not seen for this many days count as stale
+STALE_AFTER_DAYS = 30
+
+# host_stats document holding the fleet rollup
+FLEET_STATS_ID = "fleet"
+
+
+def _count_by(expression: Any) -> List[Dict]:
+    return [
+        {"$group": {"_id": expression, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+    ]
+
+
+def fleet_stats_pipeline(stale_before: datetime) -> List[Dict]:
+    """Aggregation counting integrated_hosts per OS, activity, severity and agent"""
+    return [
+        {
+            "$facet": {
+                "total": [{"$count": "count"}],
+                "by_os": _count_by({"$ifNull": ["$os", "unknown"]}),
+                "by_activity": _count_by(
+                    {
+                        "$switch": {
+                            "branches": [
+                                {
+                                    "case": {"$ne": [{"$type": "$last_seen"}, "date"]},
+                                    "then": "unknown",
+                                },
+                                {
+                                    "case": {"$lt": ["$last_seen", stale_before]},
+                                    "then": "stale",
+                                },
+                            ],
+                            "default": "active",
+                        }
+                    }
+                ),
+                # Highest severity among a host's vulnerabilities
+                "by_severity": _count_by(
+                    {
+                        "$ifNull": [
+                            {"$max": "$vuln.list.host_asset_vuln.severity"},
+                            "unknown",
+                        ]
+                    }
+                ),
+                "by_agent_version": _count_by(
+                    {
+                        "$ifNull": [
+                            "$agent_info.agent_version",
+                            "$agent_version",
+                            "unknown",
+                        ]
+                    }
+                ),
+            }
+        }
+    ]
+
+
+async def refresh_fleet_stats(db) -> Dict[str, Any]:
+    """Recompute the fleet rollup from integrated_hosts and store it in host_stats"""
+    computed_at = datetime.utcnow()
+    stale_before = computed_at - timedelta(days=STALE_AFTER_DAYS)
+    results = await db.integrated_hosts.aggregate(
+        fleet_stats_pipeline(stale_before)
+    ).to_list(length=1)
+    facets = results[0] if results else {}
+
+    def groups(name: str, label: str) -> List[Dict]:
+        return [
+            {label: group["_id"], "count": group["count"]}
+            for group in facets.get(name, [])
+        ]
+
+    total = facets.get("total") or [{"count": 0}]
+    stats = {
+        "total": total[0]["count"],
+        "by_os": groups("by_os", "os"),
+        "by_activity": groups("by_activity", "activity"),
+        "by_severity": groups("by_severity", "severity"),
+        "by_agent_version": groups("by_agent_version", "agent_version"),
+        "stale_after_days": STALE_AFTER_DAYS,
+        "computed_at": computed_at,
+    }
+    await db.host_stats.replace_one({"_id": FLEET_STATS_ID}, stats, upsert=True)
+    logger.info(f"Refreshed fleet stats over {stats['total']} hosts")
+    return stats
+
+
+async def get_fleet_stats(db) -> Dict[str, Any]:
+    """Stored fleet rollup, computed on first use if no sync has stored one yet"""
+    stats = await db.host_stats.find_one({"_id": FLEET_STATS_ID}, {"_id": 0})
+    if stats is None:
+        stats = await refresh_fleet_stats(db)
+    return stats
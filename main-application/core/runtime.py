@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Any, Coroutine, Optional, TypeVar
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+
+from .config import settings
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerRuntime:
+    """
+    The event loop and Mongo client of one Celery worker process.
+
+    Both are created once per process, after the fork, and reused by every
+    task the process runs, so tasks no longer pay for a new loop and new
+    connections each time, and the Motor client always runs on the loop it
+    was created for. Tasks of a process run one at a time, which is what
+    makes sharing one loop safe; a threaded worker pool is not supported.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+
+    def start(self) -> None:
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.client = AsyncIOMotorClient(
+            Database.get_mongo_url(),
+            io_loop=self.loop,
+            **Database.get_client_options(),
+        )
+        self.db = self.client[settings.db.database]
+        logger.info("Started worker event loop and MongoDB client")
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine to completion on the worker loop"""
+        # Started lazily where worker_process_init does not fire (solo pool)
+        self.start()
+        return self.loop.run_until_complete(coroutine)
+
+    def stop(self) -> None:
+        if self.loop is None:
+            return
+        try:
+            self.client.close()
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+        finally:
+            self.loop.close()
+            asyncio.set_event_loop(None)
+            self.loop = None
+            self.client = None
+            self.db = None
+            logger.info("Closed worker event loop and MongoDB client")
+
+
+worker_runtime = WorkerRuntime()
@@ -1,42 +1,39 @@
 import logging
 import re
 from datetime import datetime, timezone
-import copy
+from functools import lru_cache
+from typing import Any, List, Tuple
+
+DATE_CACHE_SIZE = 65536
+MAC_CACHE_SIZE = 16384
+
+_UPPERCASE_BOUNDARY = re.compile(r"(?<!^)(?=[A-Z])")
+_NON_SNAKE_CHARS = re.compile(r"[^a-z0-9_]")
+_REPEATED_UNDERSCORES = re.compile(r"_{2,}")
+_DATE_TIME_PREFIX = re.compile(r"\d{4}-\d{2}-\d{2}T")
+_DATE_PREFIX = re.compile(r"\d{4}-\d{2}-\d{2}")
+_FAST_DATE = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+_FAST_DATE_TIME = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?Z?"
+)
+_NON_HEX_CHARS = re.compile(r"[^0-9a-fA-F]")
+_FORMATTED_MAC = re.compile(r"[0-9a-f]{2}(?::[0-9a-f]{2}){5}")
 
 
 def camel_to_snake(name: str) -> str:
     # Insert underscore before uppercase letters and convert to lowercase
-    name = re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+    name = _UPPERCASE_BOUNDARY.sub("_", name).lower()
     # Replace non-alphanumeric characters with underscore
-    name = re.sub(r"[^a-z0-9_]", "_", name)
+    name = _NON_SNAKE_CHARS.sub("_", name)
     # Replace multiple consecutive underscores with a single one
-    name = re.sub(r"_{2,}", "_", name)
+    name = _REPEATED_UNDERSCORES.sub("_", name)
     # Remove trailing underscore
     name = name.rstrip("_")
     return name
 
 
-def standardize_date(date_str):
-    """
-    Convert any ISO 8601 date string to a datetime object with consistent timezone.
-    Handles various precision levels and timezone indicators.
-    All returned datetime objects will have seconds precision without microseconds
-    and will include UTC timezone information.
-
-    Args:
-        date_str: An ISO 8601 formatted date string
-
-    Returns:
-        datetime: A timezone-aware datetime object in UTC
-    """
-    if not isinstance(date_str, str):
-        return date_str
-
-    if not re.match(r"\d{4}-\d{2}-\d{2}", date_str):
-        return date_str
-
-    original = date_str  # Keep original date for logging
-
+def _parse_date(date_str: str):
+    """Full ISO 8601 parser behind standardize_date, for forms the fast path skips"""
     try:
         # First, determine if there's timezone information in the string
         has_timezone = (
@@ -50,7 +47,6 @@ def standardize_date(date_str):
             # Create datetime with UTC timezone
             base_dt = datetime.strptime(date_str, "%Y-%m-%d")
             result = base_dt.replace(microsecond=0, tzinfo=timezone.utc)
-            logging.info(f"Date parsed: '{original}' -> '{result}'")
             return result
 
         # Handle format with Z timezone (YYYY-MM-DDTHH:MM:SSZ)
@@ -63,7 +59,6 @@ def standardize_date(date_str):
             # Parse and add UTC timezone
             base_dt = datetime.strptime(clean_str, "%Y-%m-%dT%H:%M:%S")
             result = base_dt.replace(tzinfo=timezone.utc)
-            logging.info(f"Date parsed: '{original}' -> '{result}'")
             return result
 
         # For dates with timezone information, use fromisoformat
@@ -74,7 +69,6 @@ def standardize_date(date_str):
             # Parse with timezone and remove microseconds
             dt = datetime.fromisoformat(iso_str)
             result = dt.replace(microsecond=0)
-            logging.info(f"Date parsed: '{original}' -> '{result}'")
             return result
 
         # For dates without timezone (but with time), add UTC timezone
@@ -88,39 +82,106 @@ def standardize_date(date_str):
             # Parse and add UTC timezone
             base_dt = datetime.strptime(clean_str, "%Y-%m-%dT%H:%M:%S")
             result = base_dt.replace(tzinfo=timezone.utc)
-            logging.info(f"Date parsed: '{original}' -> '{result}'")
             return result
 
         # If we reach here, try a flexible approach as last resort
         dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
         result = dt.replace(microsecond=0)
-        logging.info(f"Date parsed: '{original}' -> '{result}'")
         return result
 
     except Exception as e:
-        logging.warning(f"Error parsing date '{date_str}': {str(e)}")
+        # Batches report invalid dates in one summary line (see standardize_dates)
+        logging.debug(f"Error parsing date '{date_str}': {str(e)}")
         return date_str
 
 
-def format_mac_address(value):
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _standardize_date_str(date_str: str):
+    if not _DATE_PREFIX.match(date_str):
+        return date_str
+
+    # Fast path for the forms the upstream APIs actually send:
+    # YYYY-MM-DD, and YYYY-MM-DDTHH:MM:SS[.fff] with or without a trailing Z.
+    # Both are interpreted as UTC, exactly as _parse_date does.
+    match = _FAST_DATE_TIME.fullmatch(date_str) or _FAST_DATE.fullmatch(date_str)
+    if match:
+        try:
+            return datetime(
+                *(int(part) for part in match.groups() if part is not None),
+                tzinfo=timezone.utc,
+            )
+        except ValueError:
+            pass  # Out of range values get _parse_date's error handling
+
+    return _parse_date(date_str)
+
+
+def standardize_date(date_str):
     """
-    Format MAC address to the standard format with colons (xx:xx:xx:xx:xx:xx).
-    Handles various input formats like 0a-9a-0e-ba-3f-d9 or 0a9a0eba3fd9.
+    Convert any ISO 8601 date string to a datetime object with consistent timezone.
+    Handles various precision levels and timezone indicators.
+    All returned datetime objects will have seconds precision without microseconds
+    and will include UTC timezone information.
+
+    Results are memoized, so repeated timestamps are parsed only once.
+
+    Args:
+        date_str: An ISO 8601 formatted date string
+
+    Returns:
+        datetime: A timezone-aware datetime object in UTC
     """
-    if not isinstance(value, str):
-        return value
+    if not isinstance(date_str, str):
+        return date_str
+    return _standardize_date_str(date_str)
+
+
+def standardize_dates(values: List[str]) -> Tuple[List[Any], int]:
+    """
+    Standardize a column of date strings (e.g. every last_seen of a page).
+
+    Each distinct value is converted once; results are identical to
+    standardize_date(value). Returns the results and the number of values
+    that could not be parsed, which are passed through unchanged.
+    """
+    converted = {value: standardize_date(value) for value in set(values)}
+    results = [converted[value] for value in values]
+    invalid = sum(1 for result in results if isinstance(result, str))
+    return results, invalid
+
 
+@lru_cache(maxsize=MAC_CACHE_SIZE)
+def _format_mac_str(value: str) -> str:
     # Remove any separators and check if we have 12 hex characters
-    mac_clean = re.sub(r"[^0-9a-fA-F]", "", value)
+    mac_clean = _NON_HEX_CHARS.sub("", value)
     if len(mac_clean) != 12:
         return value
 
     formatted = ":".join(mac_clean[i : i + 2] for i in range(0, 12, 2))
+    return formatted.lower()
 
-    if formatted != value:
-        logging.info(f"MAC address reformatted: '{value}' -> '{formatted}'")
 
-    return formatted.lower()
+def format_mac_address(value):
+    """
+    Format MAC address to the standard format with colons (xx:xx:xx:xx:xx:xx).
+    Handles various input formats like 0a-9a-0e-ba-3f-d9 or 0a9a0eba3fd9.
+    """
+    if not isinstance(value, str):
+        return value
+    return _format_mac_str(value)
+
+
+def format_mac_addresses(values: List[str]) -> Tuple[List[str], int]:
+    """
+    Format a column of MAC address strings, each distinct value once.
+
+    Results are identical to format_mac_address(value). Returns the results
+    and the number of values that are not MAC addresses.
+    """
+    converted = {value: format_mac_address(value) for value in set(values)}
+    results = [converted[value] for value in values]
+    invalid = sum(1 for result in results if not _FORMATTED_MAC.fullmatch(result))
+    return results, invalid
 
 
 def process_value(value, path=""):
@@ -209,91 +270,380 @@ def process_value(value, path=""):
     return value
 
 
+def _process_extended_json(value):
+    """Convert a single-key MongoDB extended JSON wrapper ($date or $numberLong)."""
+    if "$date" in value:
+        date_val = value["$date"]
+        if isinstance(date_val, str):
+            return standardize_date(date_val)
+        elif isinstance(date_val, (int, float)):
+            # Convert timestamp (milliseconds) to ISO date
+            dt = datetime.fromtimestamp(date_val / 1000)
+            return standardize_date(dt.isoformat())
+        return date_val
+
+    try:
+        return int(value["$numberLong"])
+    except (ValueError, TypeError):
+        logging.debug(f"Could not convert numberLong: {value['$numberLong']}")
+        return value["$numberLong"]
+
+
+class FieldPlan:
+    """
+    Compiled normalization plan for one key path of a source schema.
+
+    Holds everything process_value would recompute for every value found at
+    this path: the snake_case key, whether the key itself is a MAC address
+    field, and whether the path names a MAC or address field (which makes
+    string values below it candidates for MAC formatting). mac_field narrows
+    the latter to paths naming a MAC, whose values are expected to be MAC
+    addresses and are counted as invalid otherwise. Child plans are
+    learned the first time a key is seen and evicted oldest-first once a
+    node holds max_children keys, so unstable shapes cannot grow the cache
+    without bound.
+    """
+
+    __slots__ = (
+        "snake_key",
+        "is_mac_key",
+        "mac_path",
+        "mac_field",
+        "max_children",
+        "_children",
+    )
+
+    def __init__(
+        self,
+        snake_key: str,
+        is_mac_key: bool,
+        mac_path: bool,
+        mac_field: bool,
+        max_children: int,
+    ):
+        self.snake_key = snake_key
+        self.is_mac_key = is_mac_key
+        self.mac_path = mac_path
+        self.mac_field = mac_field
+        self.max_children = max_children
+        self._children = {}
+
+    def child(self, key: str) -> "FieldPlan":
+        plan = self._children.get(key)
+        if plan is None:
+            snake_key = camel_to_snake(key)
+            lower_key = key.lower()
+            plan = FieldPlan(
+                snake_key,
+                any(
+                    mac_field in snake_key
+                    for mac_field in ["mac_address", "macaddress"]
+                ),
+                self.mac_path
+                or any(field in lower_key for field in ["mac", "address"]),
+                self.mac_field or "mac" in lower_key,
+                self.max_children,
+            )
+            if len(self._children) >= self.max_children:
+                self._children.pop(next(iter(self._children)))
+            self._children[key] = plan
+        return plan
+
+
+class SchemaNormalizer:
+    """
+    Schema-compiled equivalent of process_value.
+
+    Each root (one per source, e.g. "qualys") gets a tree of FieldPlans that is
+    learned from the records it normalizes, so key renames and MAC field
+    detection are resolved once per key path instead of once per value. The
+    output is identical to process_value(value, root).
+
+    normalize_batch normalizes many records of one root together: their date
+    and MAC strings are gathered into two columns, converted with
+    standardize_dates and format_mac_addresses, and written back, with one
+    summary line for the values that could not be converted.
+    """
+
+    def __init__(self, max_children: int = 4096):
+        self.max_children = max_children
+        self._schemas = {}
+
+    def schema(self, root: str) -> FieldPlan:
+        plan = self._schemas.get(root)
+        if plan is None:
+            mac_path = any(field in root.lower() for field in ["mac", "address"])
+            plan = self._schemas[root] = FieldPlan(
+                root, False, mac_path, "mac" in root.lower(), self.max_children
+            )
+        return plan
+
+    def normalize(self, value, root=""):
+        return self._transform(value, self.schema(root))
+
+    def normalize_batch(self, values: List, root="") -> List:
+        """Normalize a batch of values of one root; same output as normalize()"""
+        plan = self.schema(root)
+        # (container, key, reformat as MAC if still a string) per date string
+        dates: List[Tuple[Any, Any, bool]] = []
+        # (container, key, expected to be a MAC) per MAC candidate string
+        macs: List[Tuple[Any, Any, bool]] = []
+        results = []
+        for value in values:
+            results.append(self._collect(value, plan, dates, macs))
+            if isinstance(value, str):
+                self._defer(results, len(results) - 1, plan, False, dates, macs)
+
+        converted, invalid_dates = standardize_dates(
+            [container[key] for container, key, _ in dates]
+        )
+        for (container, key, reformat), result in zip(dates, converted):
+            if reformat and isinstance(result, str):
+                result = format_mac_address(result)
+            container[key] = result
+
+        converted, _ = format_mac_addresses(
+            [container[key] for container, key, _ in macs]
+        )
+        invalid_macs = 0
+        for (container, key, mac_field), result in zip(macs, converted):
+            container[key] = result
+            if mac_field and not _FORMATTED_MAC.fullmatch(result):
+                invalid_macs += 1
+
+        message = (
+            f"Normalized {len(values)} {root} records: {len(dates)} dates "
+            f"({invalid_dates} invalid), {len(macs)} MAC candidates "
+            f"({invalid_macs} invalid MAC addresses)"
+        )
+        if invalid_dates or invalid_macs:
+            logging.warning(message)
+        else:
+            logging.debug(message)
+        return results
+
+    def _collect(self, value, plan: FieldPlan, dates: List, macs: List):
+        """
+        _transform with the date and MAC strings of the input left in place
+        for the columns. Only strings of the input are deferred: strings
+        produced here (by an extended JSON wrapper) are final, as in _transform.
+        """
+        if isinstance(value, dict):
+            if len(value) == 1 and ("$date" in value or "$numberLong" in value):
+                return _process_extended_json(value)
+
+            processed_dict = {}
+            # Keys whose snake_case collides overwrite each other, so only the
+            # value that is kept may be deferred, under the plan of its key
+            deferred = {}
+            for k, v in value.items():
+                child = plan.child(k)
+                if isinstance(v, str):
+                    processed_dict[child.snake_key] = v
+                    deferred[child.snake_key] = child
+                    continue
+                processed_v = self._collect(v, child, dates, macs)
+                if child.is_mac_key:
+                    processed_v = format_mac_address(processed_v)
+                processed_dict[child.snake_key] = processed_v
+                deferred.pop(child.snake_key, None)
+            for snake_key, child in deferred.items():
+                self._defer(
+                    processed_dict, snake_key, child, child.is_mac_key, dates, macs
+                )
+            return processed_dict
+
+        elif isinstance(value, list):
+            processed_list = []
+            for item in value:
+                if isinstance(item, str):
+                    processed_list.append(item)
+                    self._defer(
+                        processed_list,
+                        len(processed_list) - 1,
+                        plan,
+                        plan.mac_path,
+                        dates,
+                        macs,
+                    )
+                    continue
+                processed_item = self._collect(item, plan, dates, macs)
+                if plan.mac_path and isinstance(processed_item, str):
+                    processed_item = format_mac_address(processed_item)
+                processed_list.append(processed_item)
+            return processed_list
+
+        return value
+
+    @staticmethod
+    def _defer(
+        container, key, plan: FieldPlan, reformat: bool, dates: List, macs: List
+    ) -> None:
+        value = container[key]
+        if not isinstance(value, str):
+            return
+        if _DATE_TIME_PREFIX.match(value):
+            dates.append((container, key, reformat))
+        elif plan.mac_path:
+            macs.append((container, key, plan.mac_field))
+
+    def _transform(self, value, plan: FieldPlan):
+        if isinstance(value, dict):
+            if len(value) == 1 and ("$date" in value or "$numberLong" in value):
+                return _process_extended_json(value)
+
+            processed_dict = {}
+            for k, v in value.items():
+                child = plan.child(k)
+                processed_v = self._transform(v, child)
+                if child.is_mac_key:
+                    processed_v = format_mac_address(processed_v)
+                processed_dict[child.snake_key] = processed_v
+            return processed_dict
+
+        elif isinstance(value, list):
+            processed_list = []
+            for item in value:
+                processed_item = self._transform(item, plan)
+                if plan.mac_path and isinstance(processed_item, str):
+                    processed_item = format_mac_address(processed_item)
+                processed_list.append(processed_item)
+            return processed_list
+
+        elif isinstance(value, str):
+            if _DATE_TIME_PREFIX.match(value):
+                return standardize_date(value)
+            if plan.mac_path:
+                return format_mac_address(value)
+            return value
+
+        return value
+
+
+normalizer = SchemaNormalizer()
+
+
+def _is_scalar(value) -> bool:
+    return isinstance(value, (str, int, float, bool)) or value is None
+
+
+def _container_items(container):
+    if isinstance(container, dict):
+        return container.items()
+    return enumerate(container)
+
+
 def find_duplicates(obj1, obj2, path=""):
     """
     Find duplicate values between two objects.
     Returns a list of paths and values that are duplicates.
-    """
-    duplicates = []
-
-    if isinstance(obj1, dict) and isinstance(obj2, dict):
-        for key2, value2 in obj2.items():
-            current_path = f"{path}.{key2}" if path else key2
-
-            # If simple value and matches something in obj1, it's a duplicate
-            if isinstance(value2, (str, int, float, bool)) or value2 is None:
-                for key1, value1 in obj1.items():
-                    if value2 == value1 and key1 != key2:
-                        duplicates.append(
-                            (
-                                current_path,
-                                str(value2),
-                                f"{path}.{key1}" if path else key1,
-                            )
-                        )
-                        logging.info(
-                            f"Duplicate found: '{current_path}' and '{path}.{key1 if path else key1}' both "
-                            f"have value '{str(value2)}'"
-                        )
-
-            # Recursively check nested objects and arrays
-            elif isinstance(value2, dict) or isinstance(value2, list):
-                for key1, value1 in obj1.items():
-                    if isinstance(value1, type(value2)):
-                        sub_duplicates = find_duplicates(value1, value2, current_path)
-                        duplicates.extend(sub_duplicates)
-
-    elif isinstance(obj1, list) and isinstance(obj2, list):
-        for i, item2 in enumerate(obj2):
-            current_path = f"{path}[{i}]"
-
-            if isinstance(item2, (str, int, float, bool)) or item2 is None:
-                for j, item1 in enumerate(obj1):
-                    if item2 == item1 and i != j:
-                        duplicates.append((current_path, str(item2), f"{path}[{j}]"))
-                        logging.info(
-                            f"Duplicate found in list: '{current_path}' and '{path}[{j}]' "
-                            f"both have value '{str(item2)}'"
-                        )
-
-            elif isinstance(item2, (dict, list)):
-                for j, item1 in enumerate(obj1):
-                    if isinstance(item1, type(item2)):
-                        sub_duplicates = find_duplicates(item1, item2, current_path)
-                        duplicates.extend(sub_duplicates)
-
-    return duplicates
-
 
-def merge_data(qualys_data, crowdstrike_data):
+    A value in obj2 duplicates a sibling in obj1 when both sit in containers
+    reached through the same sequence of dict/list types, under different keys.
+    obj1 is traversed once into an index of (container type chain, value) ->
+    occurrences, which obj2 then probes, so only pairs that actually share a
+    value are ever compared. Results are returned in the same order as the
+    original pairwise comparison produced them.
     """
-    Merge the two datasets, with standardized date formats and no duplicates.
+    if not (
+        (isinstance(obj1, dict) and isinstance(obj2, dict))
+        or (isinstance(obj1, list) and isinstance(obj2, list))
+    ):
+        return []
+
+    # Container type chains from the root are interned as small integers
+    chains = {}
+
+    def chain_of(parent, container):
+        key = (parent, isinstance(container, dict))
+        if key not in chains:
+            chains[key] = len(chains)
+        return chains[key]
+
+    # (chain, value) -> [(positions of the obj1 container, position, key, value)]
+    index = {}
+    stack = [(obj1, chain_of(None, obj1), ())]
+    while stack:
+        container, chain, positions = stack.pop()
+        for position, (key, value) in enumerate(_container_items(container)):
+            if _is_scalar(value):
+                index.setdefault((chain, value), []).append(
+                    (positions, position, key, value)
+                )
+            elif isinstance(value, (dict, list)):
+                stack.append((value, chain_of(chain, value), positions + (position,)))
+
+    found = []
+    root_chain = chains.get((None, isinstance(obj2, dict)))
+    stack = [(obj2, root_chain, path, ())]
+    while stack:
+        container, chain, current, positions = stack.pop()
+        is_dict = isinstance(container, dict)
+        for position, (key2, value2) in enumerate(_container_items(container)):
+            if is_dict:
+                current_path = f"{current}.{key2}" if current else key2
+            else:
+                current_path = f"{current}[{key2}]"
+
+            if _is_scalar(value2):
+                for positions1, position1, key1, value1 in index.get(
+                    (chain, value2), ()
+                ):
+                    if key1 == key2 or value2 != value1:
+                        continue
+                    if is_dict:
+                        orig_path = f"{current}.{key1}" if current else key1
+                    else:
+                        orig_path = f"{current}[{key1}]"
+                    order = tuple(
+                        step for pair in zip(positions, positions1) for step in pair
+                    ) + (position, position1)
+                    found.append((order, (current_path, str(value2), orig_path)))
+
+            elif isinstance(value2, (dict, list)):
+                child_chain = chains.get((chain, isinstance(value2, dict)))
+                if child_chain is not None:
+                    stack.append(
+                        (value2, child_chain, current_path, positions + (position,))
+                    )
+
+    found.sort(key=lambda item: item[0])
+    return [duplicate for _, duplicate in found]
+
+
+def normalize_source(data, source: str):
+    """Normalize one source record; for a list only its first item is used."""
+    if isinstance(data, list) and data:
+        logging.debug("Processing %s data (list with %d items)", source, len(data))
+        return normalizer.normalize(data[0], source)
+    logging.debug("Processing %s data (dictionary)", source)
+    return normalizer.normalize(data, source)
+
+
+def normalize_sources(records: List, source: str) -> List:
+    """normalize_source for every record of a batch, normalized together"""
+    return normalizer.normalize_batch(
+        [
+            record[0] if isinstance(record, list) and record else record
+            for record in records
+        ],
+        source,
+    )
+
+
+def merge_normalized(processed_qualys, processed_crowdstrike):
     """
-    logging.info("Starting data merge process")
-
-    if isinstance(qualys_data, list) and qualys_data:
-        logging.info(f"Processing Qualys data (list with {len(qualys_data)} items)")
-        processed_qualys = process_value(qualys_data[0], "qualys")
-    else:
-        logging.info("Processing Qualys data (dictionary)")
-        processed_qualys = process_value(qualys_data, "qualys")
-
-    if isinstance(crowdstrike_data, list) and crowdstrike_data:
-        logging.info(
-            f"Processing CrowdStrike data (list with {len(crowdstrike_data)} items)"
-        )
-        processed_crowdstrike = process_value(crowdstrike_data[0], "crowdstrike")
-    else:
-        logging.info("Processing CrowdStrike data (dictionary)")
-        processed_crowdstrike = process_value(crowdstrike_data, "crowdstrike")
+    Merge two normalized records without copying either of them.
 
-    logging.info("Finding duplicates between datasets")
+    processed_qualys is taken over and becomes the merged document, and
+    subtrees of processed_crowdstrike are attached to it as they are, so the
+    result shares structure with both inputs. Callers must hand over freshly
+    normalized trees and not mutate them afterwards.
+    """
     duplicates = find_duplicates(processed_qualys, processed_crowdstrike)
     duplicate_paths = {path: orig_path for path, _, orig_path in duplicates}
 
-    logging.info(f"Found {len(duplicate_paths)} duplicate paths")
-
-    merged = copy.deepcopy(processed_qualys)
+    logging.debug("Found %d duplicate paths", len(duplicate_paths))
 
     def recursive_merge(target, source, base_path=""):
         """Recursively merge source into target, avoiding duplicates."""
@@ -304,25 +654,35 @@ def merge_data(qualys_data, crowdstrike_data):
             current_path = f"{base_path}.{key}" if base_path else key
 
             if current_path in duplicate_paths:
-                logging.info(
-                    f"Skipping duplicate value at '{current_path}', same as '{duplicate_paths[current_path]}'"
+                logging.debug(
+                    "Skipping duplicate value at '%s', same as '%s'",
+                    current_path,
+                    duplicate_paths[current_path],
                 )
                 continue
 
             if key not in target:
-                logging.info(f"Adding new key-value: '{current_path}' = {value}")
+                logging.debug("Adding new key-value: '%s' = %s", current_path, value)
                 target[key] = value
                 continue
 
             if isinstance(value, dict) and isinstance(target[key], dict):
-                logging.debug(f"Recursively merging dictionaries at '{current_path}'")
                 recursive_merge(target[key], value, current_path)
                 continue
 
-            logging.debug(f"Keeping existing value at '{current_path}': {target[key]}")
+            logging.debug(
+                "Keeping existing value at '%s': %s", current_path, target[key]
+            )
+
+    recursive_merge(processed_qualys, processed_crowdstrike)
+    return processed_qualys
 
-    logging.info("Merging datasets")
-    recursive_merge(merged, processed_crowdstrike)
 
-    logging.info("Merge completed successfully")
-    return merged
+def merge_data(qualys_data, crowdstrike_data):
+    """
+    Merge the two datasets, with standardized date formats and no duplicates.
+    """
+    return merge_normalized(
+        normalize_source(qualys_data, "qualys"),
+        normalize_source(crowdstrike_data, "crowdstrike"),
+    )
@@ -0,0 +1,162 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from .pipeline import HostPages, pages_in_thread
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+HOST_TYPES = ("crowdstrike", "qualys")
+
+
+def source_path(snapshot_dir: str, host_type: str) -> str:
+    return os.path.join(snapshot_dir, f"{host_type}.ndjson.gz")
+
+
+class SnapshotWriter:
+    """
+    Append-only archive of the raw upstream pages of one sync.
+
+    Each source goes to its own NDJSON file in which every page is a separate
+    gzip member, so a page is durable as soon as it is appended and a crash
+    loses at most the page being written. manifest.json is only written when
+    the sync closes the snapshot. A failing disk disables the snapshot but
+    never fails the sync.
+    """
+
+    def __init__(self, directory: str, sync_id: str, compress_level: int = 6):
+        self.sync_id = sync_id
+        self.compress_level = compress_level
+        self.created_at = datetime.now(timezone.utc)
+        self.path = os.path.join(
+            directory, f"{self.created_at:%Y%m%dT%H%M%S}-{sync_id[:8]}"
+        )
+        self.records: Dict[str, int] = {host_type: 0 for host_type in HOST_TYPES}
+        self.pages: Dict[str, int] = {host_type: 0 for host_type in HOST_TYPES}
+        self.bytes_written = 0
+        self.failed = False
+        os.makedirs(self.path, exist_ok=True)
+
+    def _append(self, host_type: str, page: List[Dict]) -> None:
+        payload = "".join(
+            json.dumps(record, separators=(",", ":")) + "\n" for record in page
+        ).encode()
+        member = gzip.compress(payload, compresslevel=self.compress_level)
+        with open(source_path(self.path, host_type), "ab") as f:
+            f.write(member)
+        self.bytes_written += len(member)
+
+    async def append(self, host_type: str, page: List[Dict]) -> None:
+        if self.failed:
+            return
+        try:
+            await asyncio.to_thread(self._append, host_type, page)
+        except (OSError, TypeError, ValueError) as e:
+            self.failed = True
+            logger.error(f"Disabling snapshot {self.path}: {str(e)}")
+            return
+        self.records[host_type] += len(page)
+        self.pages[host_type] += 1
+
+    async def tee(self, host_type: str, pages: HostPages) -> HostPages:
+        """Pass pages through unchanged, archiving each one on the way"""
+        async with aclosing(pages):
+            async for page in pages:
+                await self.append(host_type, page)
+                yield page
+
+    def close(self, **details: Any) -> None:
+        """Write the manifest; details are stored with it (e.g. max_records)"""
+        if self.failed:
+            return
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "sync_id": self.sync_id,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "records": self.records,
+            "pages": self.pages,
+            "bytes": self.bytes_written,
+            **details,
+        }
+        try:
+            with open(os.path.join(self.path, MANIFEST_NAME), "w") as f:
+                json.dump(manifest, f, indent=2)
+        except OSError as e:
+            logger.error(f"Failed to write snapshot manifest {self.path}: {str(e)}")
+            return
+        logger.info(
+            f"Wrote snapshot {self.path}: {self.records['crowdstrike']} Crowdstrike and "
+            f"{self.records['qualys']} Qualys records, {self.bytes_written} bytes"
+        )
+
+
+def open_snapshot(directory: str, sync_id: str) -> Optional[SnapshotWriter]:
+    """A writer for a new snapshot, or None if directory is unset or unusable"""
+    if not directory:
+        return None
+    try:
+        return SnapshotWriter(directory, sync_id)
+    except OSError as e:
+        logger.error(f"Cannot create snapshot in {directory}: {str(e)}")
+        return None
+
+
+def list_snapshots(directory: str) -> List[str]:
+    """Complete snapshots in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if os.path.isfile(os.path.join(directory, name, MANIFEST_NAME))
+    ]
+
+
+def prune_snapshots(directory: str, keep: int) -> None:
+    """Delete all but the newest keep complete snapshots"""
+    snapshots = list_snapshots(directory)
+    for path in snapshots[: max(len(snapshots) - keep, 0)]:
+        shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Pruned snapshot {path}")
+
+
+def read_manifest(snapshot_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _iter_pages(path: str, page_size: int) -> Iterator[List[Dict]]:
+    page: List[Dict] = []
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    raise EOFError
+                page.append(json.loads(line))
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+    except FileNotFoundError:
+        pass
+    except EOFError:
+        # The last page of an interrupted sync may be cut short
+        logger.warning(f"Snapshot file {path} is truncated, reading what is intact")
+    if page:
+        yield page
+
+
+def read_pages(snapshot_dir: str, host_type: str, page_size: int) -> HostPages:
+    """Stream the archived records of one source in pages, in fetch order"""
+    return pages_in_thread(_iter_pages(source_path(snapshot_dir, host_type), page_size))
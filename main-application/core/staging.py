@@ -0,0 +1,145 @@
+import json
+import logging
+import uuid
+import zlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import Binary
+
+from .matching import MatchKey, crowdstrike_match_key, qualys_match_key
+from .pipeline import HostPages
+
+logger = logging.getLogger(__name__)
+
+# zlib level of staged batches; higher levels barely shrink host JSON further
+COMPRESSION_LEVEL = 1
+
+MATCH_KEY_FUNCTIONS = {
+    "crowdstrike": crowdstrike_match_key,
+    "qualys": qualys_match_key,
+}
+
+
+def shard_of(key: Optional[MatchKey], shards: int) -> int:
+    """
+    Shard of a match key, stable across processes.
+
+    Records that could match share a key and so always land in the same shard.
+    Records without a key can never match and all go to shard 0, which still
+    reports them.
+    """
+    if key is None or shards <= 1:
+        return 0
+    return zlib.crc32("\0".join(map(str, key)).encode()) % shards
+
+
+def _encode_records(records: List[Dict]) -> Tuple[bytes, int]:
+    """Compressed JSON of a batch and its uncompressed size"""
+    # Raw records may hold $-prefixed keys Mongo will not store as fields
+    payload = json.dumps(records, separators=(",", ":")).encode()
+    return zlib.compress(payload, COMPRESSION_LEVEL), len(payload)
+
+
+def _decode_records(entry: Dict) -> List[Dict]:
+    return json.loads(zlib.decompress(entry["records"]))
+
+
+class ShardStager:
+    """
+    Partition raw records of one sync into shards and stage them in Mongo.
+
+    Records are grouped per source and shard into batches of batch_size, and
+    every batch gets a sequence number so a shard reads its records back in
+    fetch order, which the first-wins CrowdStrike index relies on. Batches are
+    stored as zlib-compressed JSON and expire through the staging TTL index.
+    """
+
+    def __init__(self, collection, sync_id: str, shards: int, batch_size: int = 100):
+        self.collection = collection
+        self.sync_id = sync_id
+        self.shards = shards
+        self.batch_size = batch_size
+        self.created_at = datetime.now(timezone.utc)
+        self._pending: Dict[Tuple[str, int], List[Dict]] = defaultdict(list)
+        self._seq: Dict[Tuple[str, int], int] = defaultdict(int)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    async def add(self, host_type: str, records: List[Dict]) -> None:
+        match_key = MATCH_KEY_FUNCTIONS[host_type]
+        for record in records:
+            shard = shard_of(match_key(record), self.shards)
+            batch = self._pending[(host_type, shard)]
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                await self._write(host_type, shard)
+        self.counts[host_type] += len(records)
+
+    async def _write(self, host_type: str, shard: int) -> None:
+        records = self._pending.pop((host_type, shard))
+        seq = self._seq[(host_type, shard)]
+        self._seq[(host_type, shard)] += 1
+        payload, raw_size = _encode_records(records)
+        self.raw_bytes += raw_size
+        self.stored_bytes += len(payload)
+        await self.collection.insert_one(
+            {
+                "sync_id": self.sync_id,
+                "shard": shard,
+                "source": host_type,
+                "seq": seq,
+                "count": len(records),
+                "records": Binary(payload),
+                "created_at": self.created_at,
+            }
+        )
+
+    async def flush(self) -> None:
+        for host_type, shard in list(self._pending):
+            if self._pending[(host_type, shard)]:
+                await self._write(host_type, shard)
+        logger.info(
+            f"Staged {self.counts['crowdstrike']} Crowdstrike and "
+            f"{self.counts['qualys']} Qualys records of sync {self.sync_id} "
+            f"in {self.shards} shards ({self.stored_bytes} bytes, "
+            f"{self.raw_bytes} uncompressed)"
+        )
+
+
+async def shard_pages(
+    collection, sync_id: str, shard: int, host_type: str
+) -> HostPages:
+    """Stream the staged batches of one shard and source in fetch order"""
+    entries = collection.find(
+        {"sync_id": sync_id, "shard": shard, "source": host_type}
+    ).sort("seq", 1)
+    async for entry in entries:
+        yield _decode_records(entry)
+
+
+async def stage_claim(
+    collection,
+    crowdstrike_data: List[Dict],
+    qualys_data: List[Dict],
+    batch_size: int = 100,
+) -> str:
+    """
+    Stage the records of a sync and return the claim id to hand to a task.
+
+    A claim is a single-shard staging of both sources, read back with
+    shard_pages(collection, claim_id, 0, host_type).
+    """
+    claim_id = uuid.uuid4().hex
+    stager = ShardStager(collection, claim_id, 1, batch_size=batch_size)
+    await stager.add("crowdstrike", crowdstrike_data)
+    await stager.add("qualys", qualys_data)
+    await stager.flush()
+    return claim_id
+
+
+async def drop_staged(collection, sync_id: str) -> None:
+    result = await collection.delete_many({"sync_id": sync_id})
+    logger.info(f"Dropped {result.deleted_count} staged batches of sync {sync_id}")
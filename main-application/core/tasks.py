@@ -1,14 +1,22 @@
 import logging
-import motor.motor_asyncio
 import asyncio
-from typing import Dict, List, Any
-from celery import Task
+import uuid
+from typing import Dict, List, Any, Optional
+from celery import Task, chord
 from datetime import datetime
 
 from .celery_app import celery_app
 from .config import settings
+from .cache import bump_generation
+from .database import ensure_indexes
+from .host_details import details_backfilled, mark_details_backfilled
+from .metrics import SYNC_SECONDS
 from .api_client import SilkApiClient
-from .scripts import merge_data
+from .pipeline import HostPages, HostSource, SyncPipeline, as_pages, fetch_pages
+from .rollups import refresh_fleet_stats
+from .runtime import worker_runtime
+from .snapshots import SnapshotWriter, open_snapshot, prune_snapshots
+from .staging import ShardStager, drop_staged, shard_pages, stage_claim
 
 logger = logging.getLogger(__name__)
 
@@ -16,56 +24,339 @@ logger = logging.getLogger(__name__)
 class DatabaseTask(Task):
     """Base Celery database connection handler"""
 
-    _db = None
-
     @property
     def db(self):
-        if self._db is None:
-            mongo_url = f"mongodb://{settings.db.user}:{settings.db.password}@{settings.db.host}:{settings.db.port}/{settings.db.database}?authSource=admin"
-            client = motor.motor_asyncio.AsyncIOMotorClient(mongo_url)
-            self._db = client[settings.db.database]
-        return self._db
+        worker_runtime.start()
+        return worker_runtime.db
+
+    def run_async(self, coroutine):
+        """Run a coroutine on the worker process's event loop"""
+        return worker_runtime.run(coroutine)
 
 
 @celery_app.task(bind=True, base=DatabaseTask, name="process_hosts_data")
-def process_hosts_data(
-    self, crowdstrike_data: List[Dict], qualys_data: List[Dict]
-) -> Dict[str, Any]:
-    logger.info("Starting security data processing task")
-    result = asyncio.run(process_and_save_data(self.db, crowdstrike_data, qualys_data))
+def process_hosts_data(self, claim_id: str) -> Dict[str, Any]:
+    """
+    Process hosts staged under claim_id by stage_claim.
+
+    Only the claim id travels through the broker; queue the task with
+    enqueue_hosts_data rather than passing records to it.
+    """
+    logger.info(f"Starting security data processing task for claim {claim_id}")
+    result = self.run_async(process_claim(self.db, claim_id))
     logger.info(f"Completed security data processing task: {result}")
     return result
 
 
+async def enqueue_hosts_data(db, crowdstrike_data: List[Dict], qualys_data: List[Dict]):
+    """
+    Queue process_hosts_data for the given records.
+
+    The records are staged compressed in sync_staging and only their claim id
+    is sent, instead of the whole fleet going through Redis twice, as the
+    message and as the stored task arguments.
+    """
+    await ensure_indexes(db)
+    claim_id = await stage_claim(
+        db.sync_staging,
+        crowdstrike_data,
+        qualys_data,
+        batch_size=settings.sync.stage_batch_size,
+    )
+    logger.info(f"Queued hosts data processing for claim {claim_id}")
+    return process_hosts_data.delay(claim_id)
+
+
 @celery_app.task(bind=True, base=DatabaseTask, name="fetch_and_process_hosts_data")
 def fetch_and_process_hosts_data(
     self,
     max_records: int = 100,
+    force_full: bool = False,
 ) -> Dict[str, Any]:
-    logger.info(f"Fetching security data from API (max_records={max_records})")
-    try:
-        client = SilkApiClient(
-            base_url=settings.api.api_url, token=settings.api.api_key
+    logger.info(
+        f"Fetching security data from API (max_records={max_records}, force_full={force_full})"
+    )
+    shards = settings.sync.shards
+    if shards > 1 and settings.sync.match_mode != "exact":
+        # Shards partition on the exact match key; scored matches can pair
+        # records of different shards, so every record has to meet in one task
+        logger.warning(
+            f"Ignoring SYNC_SHARDS={shards}: {settings.sync.match_mode} matching runs unsharded"
         )
-        data = client.fetch_all_hosts(max_records=max_records)
-        return process_hosts_data(data["crowdstrike"], data["qualys"])
+        shards = 1
+    if (
+        settings.sync.host_details
+        and not force_full
+        and not self.run_async(details_backfilled(self.db))
+    ):
+        # Unchanged hosts are skipped, so only a full sync gives every host its rows
+        logger.info("Host details were never filled in, running a full sync")
+        force_full = True
+    sync_id = uuid.uuid4().hex
+    snapshot = open_snapshot(settings.snapshot.directory, sync_id)
+    status = "error"
+    try:
+        with SilkApiClient(
+            base_url=settings.api.api_url,
+            token=settings.api.api_key,
+            page_size=settings.api.page_size,
+            max_in_flight=settings.api.max_in_flight,
+            timeout=settings.api.timeout,
+            connect_timeout=settings.api.connect_timeout,
+            max_retries=settings.api.max_retries,
+            backoff_base=settings.api.backoff_base,
+            backoff_max=settings.api.backoff_max,
+        ) as client:
+            if shards > 1:
+                started_at = datetime.now()
+                self.run_async(
+                    stage_shards(
+                        self.db, client, max_records, sync_id, shards, snapshot
+                    )
+                )
+                fetch_stats = client.fetch_stats()
+                # Whether the sync succeeds is only known once the shards ran
+                status = "staged"
+            else:
+                result = self.run_async(
+                    process_and_save_data(
+                        self.db,
+                        source_pages(client, "crowdstrike", max_records, snapshot),
+                        source_pages(client, "qualys", max_records, snapshot),
+                        force_full=force_full,
+                    )
+                )
+                status = result["status"]
+                if status == "success" and force_full and settings.sync.host_details:
+                    self.run_async(mark_details_backfilled(self.db))
+                result["fetch"] = client.fetch_stats()
+                logger.info(f"Completed security data processing task: {result}")
+                return result
     except Exception as e:
         logger.error(f"Error fetching and processing security data: {str(e)}")
         raise
+    finally:
+        if snapshot is not None:
+            snapshot.close(
+                status=status,
+                max_records=max_records,
+                force_full=force_full,
+                stop_at_watermark=settings.sync.stop_at_watermark and not force_full,
+            )
+            prune_snapshots(settings.snapshot.directory, settings.snapshot.keep)
+
+    # The chord's result, the aggregated summary, becomes this task's result.
+    # A shard out of retries fails the chord, which runs fail_host_sync instead
+    logger.info(f"Fanning out sync {sync_id} to {shards} shard tasks")
+    finish = finish_host_sync.s(
+        sync_id, started_at.isoformat(), fetch_stats, force_full
+    )
+    finish.on_error(fail_host_sync.s(sync_id, started_at.isoformat()))
+    return self.replace(
+        chord(
+            [
+                process_host_shard.s(sync_id, shard, force_full)
+                for shard in range(shards)
+            ],
+            finish,
+        )
+    )
+
+
+@celery_app.task(
+    bind=True,
+    base=DatabaseTask,
+    name="process_host_shard",
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=settings.sync.shard_max_retries,
+)
+def process_host_shard(
+    self, sync_id: str, shard: int, force_full: bool = False
+) -> Dict[str, int]:
+    """Match, merge and save the staged records of one shard of a sync"""
+    logger.info(f"Processing shard {shard} of sync {sync_id}")
+    staging = self.db.sync_staging
+    counts = self.run_async(
+        process_data(
+            self.db,
+            shard_pages(staging, sync_id, shard, "crowdstrike"),
+            shard_pages(staging, sync_id, shard, "qualys"),
+            force_full=force_full,
+            # Pages of a shard say nothing about where the whole source stops
+            stop_at_watermark=False,
+        )
+    )
+    logger.info(f"Completed shard {shard} of sync {sync_id}: {counts}")
+    return counts
+
+
+@celery_app.task(bind=True, base=DatabaseTask, name="finish_host_sync")
+def finish_host_sync(
+    self,
+    shard_results: List[Dict[str, int]],
+    sync_id: str,
+    started_at: str,
+    fetch_stats: Optional[Dict[str, Dict[str, Any]]] = None,
+    force_full: bool = False,
+) -> Dict[str, Any]:
+    """Chord callback: add up the shard counts and finish the sync"""
+    result = self.run_async(
+        finish_sharded_sync(
+            self.db,
+            shard_results,
+            sync_id,
+            datetime.fromisoformat(started_at),
+            force_full=force_full,
+        )
+    )
+    if fetch_stats is not None:
+        result["fetch"] = fetch_stats
+    logger.info(f"Completed security data processing task: {result}")
+    return result
+
+
+@celery_app.task(bind=True, base=DatabaseTask, name="fail_host_sync")
+def fail_host_sync(
+    self, callback_id: str, sync_id: str, started_at: str
+) -> Dict[str, Any]:
+    """
+    Chord error callback: finish a sync whose shards did not all succeed.
+
+    Called with the id of the finish_host_sync that will not run. Shards
+    that did succeed have written their hosts, so derived data and cached
+    responses are still refreshed, and the staged records are dropped.
+    """
+    result = self.run_async(
+        fail_sharded_sync(self.db, sync_id, datetime.fromisoformat(started_at))
+    )
+    logger.error(f"Sync {sync_id} failed: {result}")
+    return result
+
+
+def source_pages(
+    client: SilkApiClient,
+    host_type: str,
+    max_records: int,
+    snapshot: Optional[SnapshotWriter] = None,
+) -> HostPages:
+    """Pages of one source from the API, archived to snapshot if there is one"""
+    pages = fetch_pages(client, host_type, max_records)
+    if snapshot is not None:
+        pages = snapshot.tee(host_type, pages)
+    return pages
+
+
+async def stage_shards(
+    db,
+    client: SilkApiClient,
+    max_records: int,
+    sync_id: str,
+    shards: int,
+    snapshot: Optional[SnapshotWriter] = None,
+) -> None:
+    """Fetch both sources and stage their records partitioned by match key"""
+    await ensure_indexes(db)
+    stager = ShardStager(
+        db.sync_staging, sync_id, shards, batch_size=settings.sync.stage_batch_size
+    )
+
+    async def stage(host_type: str) -> None:
+        async for page in source_pages(client, host_type, max_records, snapshot):
+            await stager.add(host_type, page)
+
+    await asyncio.gather(stage("crowdstrike"), stage("qualys"))
+    await stager.flush()
+
+
+async def finish_sharded_sync(
+    db,
+    shard_results: List[Dict[str, int]],
+    sync_id: str,
+    started_at: datetime,
+    force_full: bool = False,
+) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for shard_counts in shard_results:
+        for name, value in shard_counts.items():
+            counts[name] = counts.get(name, 0) + value
+
+    await finish_sync(db)
+    await drop_staged(db.sync_staging, sync_id)
+    if force_full and settings.sync.host_details:
+        await mark_details_backfilled(db)
+
+    end_time = datetime.now()
+    duration = (end_time - started_at).total_seconds()
+    SYNC_SECONDS.labels(status="success").observe(duration)
+    return {
+        "status": "success",
+        **counts,
+        "shards": len(shard_results),
+        "duration_seconds": duration,
+        "timestamp": end_time.isoformat(),
+    }
+
+
+async def fail_sharded_sync(db, sync_id: str, started_at: datetime) -> Dict[str, Any]:
+    await finish_sync(db)
+    await drop_staged(db.sync_staging, sync_id)
+
+    end_time = datetime.now()
+    duration = (end_time - started_at).total_seconds()
+    SYNC_SECONDS.labels(status="error").observe(duration)
+    return {
+        "status": "error",
+        "error": "One or more shards failed",
+        "duration_seconds": duration,
+        "timestamp": end_time.isoformat(),
+    }
+
+
+async def process_claim(db, claim_id: str) -> Dict[str, Any]:
+    """Process the records of a claim; a failed claim is left to the TTL for a retry"""
+    staging = db.sync_staging
+    result = await process_and_save_data(
+        db,
+        shard_pages(staging, claim_id, 0, "crowdstrike"),
+        shard_pages(staging, claim_id, 0, "qualys"),
+    )
+    if result["status"] == "success":
+        await drop_staged(staging, claim_id)
+    return result
+
+
+async def finish_sync(db) -> None:
+    """Refresh what is derived from integrated_hosts once a sync has written"""
+    try:
+        await refresh_fleet_stats(db)
+    except Exception as e:
+        logger.warning(f"Failed to refresh fleet stats: {str(e)}")
+    try:
+        await bump_generation(db)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate cached host responses: {str(e)}")
 
 
 async def process_and_save_data(
-    db, crowdstrike_data: List[Dict], qualys_data: List[Dict]
+    db,
+    crowdstrike_data: HostSource,
+    qualys_data: HostSource,
+    force_full: bool = False,
 ) -> Dict[str, Any]:
     start_time = datetime.now()
     try:
-        integrated_hosts = await process_data(db, crowdstrike_data, qualys_data)
+        await ensure_indexes(db)
+        counts = await process_data(
+            db, crowdstrike_data, qualys_data, force_full=force_full
+        )
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
+        SYNC_SECONDS.labels(status="success").observe(duration)
 
         return {
             "status": "success",
-            "processed_count": len(integrated_hosts),
+            **counts,
             "duration_seconds": duration,
             "timestamp": end_time.isoformat(),
         }
@@ -74,6 +365,7 @@ async def process_and_save_data(
         logger.error(f"Error in process_and_save_data: {str(e)}")
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
+        SYNC_SECONDS.labels(status="error").observe(duration)
 
         return {
             "status": "error",
@@ -82,59 +374,44 @@ async def process_and_save_data(
             "timestamp": end_time.isoformat(),
         }
 
+    finally:
+        # Even a failed sync may have written some batches
+        await finish_sync(db)
 
-async def process_data(
-    db, crowdstrike_data: List[Dict], qualys_data: List[Dict]
-) -> List:
-    logger.info(
-        f"Processing data: {len(crowdstrike_data)} Crowdstrike records, {len(qualys_data)} Qualys records"
-    )
-    merged_records = []
-
-    for qualys in qualys_data:
-        if "address" not in qualys or "dnsHostName" not in qualys:
-            logger.warning(
-                f"Skipping Qualys record without address or dnsHostName: {qualys.get('_id', 'unknown')}"
-            )
-            continue
-
-        for crowdstrike in crowdstrike_data:
-            if "local_ip" not in crowdstrike or "hostname" not in crowdstrike:
-                logger.warning(
-                    f"Skipping Crowdstrike record without local_ip or hostname: {crowdstrike.get('device_id', 'unknown')}"
-                )
-                continue
-
-            if (
-                qualys["address"] == crowdstrike["local_ip"]
-                and qualys["dnsHostName"] == crowdstrike["hostname"]
-            ):
-                logger.info(
-                    f"Match found - Qualys ID: {qualys.get('id')}, "
-                    f"Crowdstrike ID: {crowdstrike.get('device_id')}"
-                )
-                merged_data = merge_data(qualys, crowdstrike)
-                existing = await db.integrated_hosts.find_one(
-                    {
-                        "address": qualys["address"],
-                        "dns_host_name": qualys["dnsHostName"],
-                    }
-                )
 
-                if existing:
-                    logger.info(
-                        f"Updating existing record for {qualys['address']} / {qualys['dnsHostName']}"
-                    )
-                    await db.integrated_hosts.replace_one(
-                        {"_id": existing["_id"]}, merged_data
-                    )
-                else:
-                    logger.info(
-                        f"Inserting new record for {qualys['address']} / {qualys['dnsHostName']}"
-                    )
-                    await db.integrated_hosts.insert_one(merged_data)
-                merged_records.append(merged_data)
-                break
+async def process_data(
+    db,
+    crowdstrike_data: HostSource,
+    qualys_data: HostSource,
+    force_full: bool = False,
+    stop_at_watermark: Optional[bool] = None,
+) -> Dict[str, int]:
+    """
+    Match, merge and save hosts from two sources.
 
-    logger.info(f"Processed {len(merged_records)} matched records")
-    return merged_records
+    Each source is either a full list of records or an async iterator of pages;
+    both are streamed through the same bounded pipeline. force_full reprocesses
+    and rewrites every host even if its fingerprints are unchanged.
+    stop_at_watermark defaults to SYNC_STOP_AT_WATERMARK.
+    """
+    if stop_at_watermark is None:
+        stop_at_watermark = settings.sync.stop_at_watermark
+    pipeline = SyncPipeline(
+        db,
+        write_batch_size=settings.sync.write_batch_size,
+        page_queue_size=settings.sync.page_queue_size,
+        queue_size=settings.sync.queue_size,
+        incremental=settings.sync.incremental,
+        force_full=force_full,
+        stop_at_watermark=stop_at_watermark,
+        match_mode=settings.sync.match_mode,
+        match_threshold=settings.sync.match_threshold,
+        match_max_block_size=settings.sync.match_max_block_size,
+        merge_processes=settings.sync.merge_processes,
+        merge_chunk_size=settings.sync.merge_chunk_size,
+        host_details=settings.sync.host_details,
+    )
+    return await pipeline.run(
+        as_pages(crowdstrike_data, settings.api.page_size),
+        as_pages(qualys_data, settings.api.page_size),
+    )
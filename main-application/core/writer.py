@@ -0,0 +1,89 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReplaceOne
+
+from .metrics import DB_WRITE_SECONDS, DOCUMENTS_WRITTEN
+
+logger = logging.getLogger(__name__)
+
+
+def host_key_filter(document: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "address": document.get("address"),
+        "dns_host_name": document.get("dns_host_name"),
+    }
+
+
+class BulkHostWriter:
+    """
+    Batched upsert writer for merged host documents.
+
+    Documents are buffered until batch_size is reached and then sent as one
+    unordered bulk_write of ReplaceOne upserts keyed on (address, dns_host_name).
+    Within a batch the last document for a key wins, so that two upserts of the
+    same new host can never race against the unique index. on_write, if given,
+    is awaited with the documents of every batch once they are written, and
+    on_flush after every flush.
+    """
+
+    def __init__(
+        self,
+        collection,
+        batch_size: int = 500,
+        on_flush: Optional[Callable[[], Awaitable[None]]] = None,
+        on_write: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+    ):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.on_write = on_write
+        self._batch: Dict[tuple, Dict[str, Any]] = {}
+        self.written = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    async def add(self, document: Dict[str, Any]) -> None:
+        key = tuple(host_key_filter(document).values())
+        self._batch[key] = document
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._batch:
+            await self._write_batch()
+        if self.on_flush is not None:
+            await self.on_flush()
+
+    async def _write_batch(self) -> None:
+        documents = list(self._batch.values())
+        requests = [
+            ReplaceOne(host_key_filter(document), document, upsert=True)
+            for document in documents
+        ]
+        self._batch = {}
+
+        with DB_WRITE_SECONDS.time():
+            result = await self.collection.bulk_write(requests, ordered=False)
+        unchanged = result.matched_count - result.modified_count
+        self.written += len(requests)
+        self.inserted += result.upserted_count
+        self.updated += result.modified_count
+        self.unchanged += unchanged
+        DOCUMENTS_WRITTEN.labels(outcome="inserted").inc(result.upserted_count)
+        DOCUMENTS_WRITTEN.labels(outcome="updated").inc(result.modified_count)
+        DOCUMENTS_WRITTEN.labels(outcome="unchanged").inc(unchanged)
+        logger.debug(
+            f"Wrote batch of {len(requests)} hosts: {result.upserted_count} inserted, "
+            f"{result.modified_count} updated"
+        )
+        if self.on_write is not None:
+            await self.on_write(documents)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inserted_count": self.inserted,
+            "updated_count": self.updated,
+            "unchanged_count": self.unchanged,
+        }
@@ -1,4 +1,5 @@
 import logging
+import time
 
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,6 +7,7 @@ from fastapi.responses import (
     ORJSONResponse,
     JSONResponse,
     HTMLResponse,
+    PlainTextResponse,
     RedirectResponse,
 )
 from fastapi.templating import Jinja2Templates
@@ -13,8 +15,15 @@ from fastapi import Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from api import router as api_router
+from core.cache import response_cache
 from core.config import settings
-from core.database import db_instance, get_database
+from core.database import (
+    backfill_derived_fields,
+    db_instance,
+    ensure_indexes,
+    get_database,
+)
+from core.metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, render
 
 # Set up templates
 templates = Jinja2Templates(directory="templates")
@@ -43,16 +52,32 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.labels(
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code,
+    ).observe(time.perf_counter() - start)
+    return response
+
+
 @app.on_event("startup")
 async def startup_db_client():
     """Connect to database when app starts"""
     await db_instance.connect_to_database()
+    await ensure_indexes(db_instance.db)
+    await backfill_derived_fields(db_instance.db)
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Close database connection when app shuts down"""
     await db_instance.close_database_connection()
+    await response_cache.close()
 
 
 @app.get("/health", tags=["Health"])
@@ -81,6 +106,12 @@ async def health_check(db: AsyncIOMotorDatabase = Depends(get_database)):
         )
 
 
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health"])
+async def metrics():
+    """Prometheus metrics of the API process"""
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/", response_class=HTMLResponse, tags=["UI"])
 async def root(request: Request):
     """Redirect to the index.html page"""
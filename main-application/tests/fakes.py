@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+
+class FakeCursor:
+    def __init__(self, documents: List[Dict]):
+        self.documents = documents
+
+    def sort(self, field: str, direction: int = 1) -> "FakeCursor":
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        self._iterator = iter(self.documents)
+        return self
+
+    async def __anext__(self) -> Dict:
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """In-memory stand-in for the few Motor collection calls staging makes"""
+
+    def __init__(self):
+        self.documents: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def _matches(document: Dict, query: Dict) -> bool:
+        return all(document.get(name) == value for name, value in query.items())
+
+    async def insert_one(self, document: Dict) -> None:
+        self.documents.append(dict(document))
+
+    def find(self, query: Dict) -> FakeCursor:
+        return FakeCursor([d for d in self.documents if self._matches(d, query)])
+
+    async def delete_many(self, query: Dict) -> SimpleNamespace:
+        kept = [d for d in self.documents if not self._matches(d, query)]
+        deleted = len(self.documents) - len(kept)
+        self.documents = kept
+        return SimpleNamespace(deleted_count=deleted)
@@ -0,0 +1,51 @@
+import pytest
+import requests
+
+from core.api_client import SilkApiClient, UpstreamUnavailableError
+
+
+def make_client(failures):
+    client = SilkApiClient(
+        base_url="http://upstream.invalid",
+        token="token",
+        max_retries=2,
+        backoff_base=0.001,
+        backoff_max=0.001,
+    )
+
+    def request(*args, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        return [{"id": 1}]
+
+    client._make_request = request
+    return client
+
+
+def test_truncated_bodies_are_retried():
+    client = make_client(
+        [
+            requests.exceptions.ChunkedEncodingError("connection broken"),
+            requests.exceptions.JSONDecodeError("Expecting value", "", 0),
+        ]
+    )
+    assert client.fetch_hosts("qualys") == [{"id": 1}]
+    assert client.limiters["qualys"].in_flight == 0
+    assert client.limiters["qualys"].retries == 2
+
+
+@pytest.mark.parametrize(
+    "error, raised",
+    [
+        (requests.exceptions.InvalidURL("bad url"), requests.exceptions.InvalidURL),
+        (
+            requests.exceptions.ContentDecodingError("bad gzip"),
+            UpstreamUnavailableError,
+        ),
+    ],
+)
+def test_failed_requests_release_their_slot(error, raised):
+    client = make_client([error] * 3)
+    with pytest.raises(raised):
+        client.fetch_hosts("crowdstrike")
+    assert client.limiters["crowdstrike"].in_flight == 0
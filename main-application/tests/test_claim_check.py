@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+import core.tasks as tasks
+from core.staging import shard_pages, stage_claim
+from tests.fakes import FakeCollection
+
+
+def crowdstrike_record(i):
+    return {"hostname": f"host-{i}", "local_ip": f"10.0.0.{i}", "$weird": i}
+
+
+def qualys_record(i):
+    return {"dnsHostName": f"host-{i}", "address": f"10.0.0.{i}"}
+
+
+async def read_back(collection, claim_id, host_type):
+    records = []
+    async for page in shard_pages(collection, claim_id, 0, host_type):
+        records.extend(page)
+    return records
+
+
+def test_stage_claim_round_trips_records_in_order():
+    collection = FakeCollection()
+    crowdstrike = [crowdstrike_record(i) for i in range(25)]
+    qualys = [qualys_record(i) for i in range(7)]
+
+    async def run():
+        claim_id = await stage_claim(collection, crowdstrike, qualys, batch_size=10)
+        return (
+            await read_back(collection, claim_id, "crowdstrike"),
+            await read_back(collection, claim_id, "qualys"),
+        )
+
+    assert asyncio.run(run()) == (crowdstrike, qualys)
+    assert len(collection.documents) == 4
+
+
+def test_enqueue_hosts_data_sends_only_the_claim_id(monkeypatch):
+    db = SimpleNamespace(sync_staging=FakeCollection())
+    sent = []
+
+    async def no_indexes(db):
+        pass
+
+    monkeypatch.setattr(tasks, "ensure_indexes", no_indexes)
+    monkeypatch.setattr(
+        tasks.process_hosts_data, "delay", lambda *args, **kwargs: sent.append(args)
+    )
+    crowdstrike = [crowdstrike_record(i) for i in range(3)]
+    qualys = [qualys_record(i) for i in range(3)]
+
+    asyncio.run(tasks.enqueue_hosts_data(db, crowdstrike, qualys))
+
+    assert len(sent) == 1
+    (claim_id,) = sent[0]
+    assert isinstance(claim_id, str)
+    assert asyncio.run(read_back(db.sync_staging, claim_id, "qualys")) == qualys
+
+
+def test_process_claim_drops_only_successful_claims(monkeypatch):
+    db = SimpleNamespace(sync_staging=FakeCollection())
+    status = {"value": "success"}
+    processed = []
+
+    async def fake_process(db, crowdstrike_pages, qualys_pages, force_full=False):
+        async for page in crowdstrike_pages:
+            processed.extend(page)
+        async for page in qualys_pages:
+            processed.extend(page)
+        return {"status": status["value"]}
+
+    monkeypatch.setattr(tasks, "process_and_save_data", fake_process)
+    records = [crowdstrike_record(1)], [qualys_record(1)]
+
+    claim_id = asyncio.run(stage_claim(db.sync_staging, *records))
+    asyncio.run(tasks.process_claim(db, claim_id))
+    assert processed == records[0] + records[1]
+    assert db.sync_staging.documents == []
+
+    status["value"] = "error"
+    claim_id = asyncio.run(stage_claim(db.sync_staging, *records))
+    asyncio.run(tasks.process_claim(db, claim_id))
+    assert len(db.sync_staging.documents) == 2
@@ -0,0 +1,162 @@
+import copy
+import random
+
+import pytest
+
+from benchmarks.mock_upstream import DatasetConfig, SyntheticFleet
+from core import scripts
+from core.scripts import SchemaNormalizer
+from tests import reference_scripts as reference
+
+KEYS = [
+    "macAddress",
+    "address",
+    "dnsHostName",
+    "HostAssetInterface",
+    "list",
+    "lastSeen",
+    "fooBar",
+    "foo_bar",
+    "Mac",
+    "ipAddresses",
+    "name",
+    "$date",
+    "$numberLong",
+    "id",
+    "x-y",
+    "ABC",
+    "version",
+]
+
+SCALARS = [
+    "0a-9a-0e-ba-3f-d9",
+    "0A9A0EBA3FD9",
+    "aabbccddeeff",
+    "zz:zz",
+    "2025-01-02T03:04:05Z",
+    "2025-01-02T03:04:05.123456Z",
+    "2025-01-02T03:04:05.123+02:00",
+    "2025-01-02T03:04:05",
+    "2025-01-02",
+    "2025-13-45T00:00:00Z",
+    "hello",
+    "10.0.0.1",
+    "1",
+    1,
+    0,
+    2.5,
+    True,
+    None,
+    1700000000000,
+]
+
+EDGE_RECORDS = [
+    {
+        "created": {"$date": "2024-06-12T06:26:18.000Z"},
+        "modified": {"$date": 1718173578000},
+        "removed": {"$date": None},
+        "totalMemory": {"$numberLong": "17179869184"},
+        "badLong": {"$numberLong": "not a number"},
+        "macAddress": "0A-9A-0E-BA-3F-D9",
+        "macAddresses": ["0a9a0eba3fd9", "AA:BB:CC:DD:EE:FF", "short"],
+        "ipAddress": "10.0.0.1",
+        "lastSeen": "2024-13-01T00:00:00Z",
+        "firstSeen": "2024-01-01T10:00:00+05:30",
+        "nested": {"list": [[{"MacAddress": "aabbccddeeff"}], {"Address": "x"}]},
+    },
+    {
+        "hostname": "host-1",
+        "dnsHostName": "host-1",
+        "address": "10.0.0.1",
+        "local_ip": "10.0.0.1",
+        "tags": ["a", "b", "a", 1, True, None, None],
+        "agentInfo": {"status": "ok", "state": "ok", "count": 1, "flag": True},
+    },
+]
+
+
+def fuzz_value(rng: random.Random, depth: int):
+    roll = rng.random()
+    if depth > 3 or roll < 0.4:
+        return rng.choice(SCALARS)
+    if roll < 0.7:
+        return {
+            rng.choice(KEYS): fuzz_value(rng, depth + 1)
+            for _ in range(rng.randint(0, 4))
+        }
+    return [fuzz_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+
+
+def fuzz_records(seed: int, count: int):
+    rng = random.Random(seed)
+    return [
+        {rng.choice(KEYS): fuzz_value(rng, 1) for _ in range(rng.randint(1, 8))}
+        for _ in range(count)
+    ]
+
+
+def fleet_pairs(count: int):
+    fleet = SyntheticFleet(DatasetConfig(hosts=count, software_per_host=5))
+    return list(
+        zip(fleet.page("qualys", 0, count), fleet.page("crowdstrike", 0, count))
+    )
+
+
+FUZZ_RECORDS = fuzz_records(seed=7, count=200)
+FLEET_PAIRS = fleet_pairs(20)
+RECORDS = (
+    EDGE_RECORDS + FUZZ_RECORDS + [record for pair in FLEET_PAIRS for record in pair]
+)
+PAIRS = (
+    [(EDGE_RECORDS[0], EDGE_RECORDS[1]), (EDGE_RECORDS[1], EDGE_RECORDS[0])]
+    + list(zip(FUZZ_RECORDS[::2], FUZZ_RECORDS[1::2]))
+    + FLEET_PAIRS
+)
+
+
+@pytest.mark.parametrize("root", ["", "qualys", "crowdstrike", "mac"])
+def test_process_value_matches_reference(root):
+    for record in RECORDS:
+        assert scripts.process_value(record, root) == reference.process_value(
+            record, root
+        )
+
+
+@pytest.mark.parametrize("root", ["qualys", "crowdstrike"])
+def test_schema_normalizer_matches_reference(root):
+    expected = [reference.process_value(record, root) for record in RECORDS]
+
+    normalizer = SchemaNormalizer()
+    assert [normalizer.normalize(record, root) for record in RECORDS] == expected
+    # A warm schema must give the same results as a cold one
+    assert [normalizer.normalize(record, root) for record in RECORDS] == expected
+    assert SchemaNormalizer().normalize_batch(RECORDS, root) == expected
+
+
+def test_find_duplicates_matches_reference():
+    for qualys, crowdstrike in PAIRS:
+        assert scripts.find_duplicates(qualys, crowdstrike) == (
+            reference.find_duplicates(qualys, crowdstrike)
+        )
+        processed_qualys = reference.process_value(qualys, "qualys")
+        processed_crowdstrike = reference.process_value(crowdstrike, "crowdstrike")
+        assert scripts.find_duplicates(
+            processed_qualys, processed_crowdstrike
+        ) == reference.find_duplicates(processed_qualys, processed_crowdstrike)
+
+
+def test_find_duplicates_of_lists_matches_reference():
+    for first, second in zip(FUZZ_RECORDS[::2], FUZZ_RECORDS[1::2]):
+        first, second = list(first.values()), list(second.values())
+        assert scripts.find_duplicates(first, second, "root") == (
+            reference.find_duplicates(first, second, "root")
+        )
+
+
+def test_merge_data_matches_reference():
+    for qualys, crowdstrike in PAIRS:
+        expected = reference.merge_data(
+            copy.deepcopy(qualys), copy.deepcopy(crowdstrike)
+        )
+        assert scripts.merge_data(qualys, crowdstrike) == expected
+        assert scripts.merge_data([qualys], [crowdstrike]) == expected